@@ -0,0 +1,73 @@
+"""
+Helpers shared by the market analyzers: JSON export and batch runs.
+
+orjson and joblib are optional: without them, analyses are written with the
+json module and batches run in a single process.
+"""
+
+import numpy as np
+import json
+import os
+import logging
+from detector import NpEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logging.info("orjson not available - analysis files will be written with the json module")
+
+try:
+    from joblib import Parallel, delayed, cpu_count
+except ImportError:
+    Parallel = None
+    logging.info("joblib not available - batch analysis will run in a single process")
+
+
+def dump_analysis(path, analysis):
+    """
+    Write an analysis dict to path as indented JSON.
+
+    The file is written under a temporary name and renamed, so readers never see
+    a partial analysis.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if orjson is not None:
+        # NumPy scalars/arrays are serialized natively; NpEncoder only sees what orjson cannot handle
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(analysis, default=NpEncoder().default,
+                                 option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        # json.dump emits many small chunks; a 1 MiB buffer batches them into few writes
+        with open(tmp_path, 'w', buffering=1 << 20) as f:
+            json.dump(analysis, f, indent=2, cls=NpEncoder)
+    os.replace(tmp_path, path)
+
+
+def run_in_chunks(items, worker, n_jobs, *args):
+    """
+    Run worker(chunk, *args) over contiguous chunks of items, one chunk per worker process.
+
+    Process startup and pickling are paid once per chunk rather than once per item.
+    Each call returns a dict; the merged dict is returned. n_jobs < 0 or None uses
+    every CPU.
+    """
+    items = list(items)
+    if not items:
+        return {}
+
+    if Parallel is None:
+        return worker(items, *args)
+
+    n_workers = cpu_count() if n_jobs is None or n_jobs < 0 else max(n_jobs, 1)
+    bounds = np.array_split(np.arange(len(items)), min(n_workers, len(items)))
+    chunks = [items[chunk[0]:chunk[-1] + 1] for chunk in bounds]
+
+    results = Parallel(n_jobs=len(chunks), prefer='processes')(
+        delayed(worker)(chunk, *args) for chunk in chunks
+    )
+
+    merged = {}
+    for chunk_result in results:
+        merged.update(chunk_result)
+    return merged
@@ -52,7 +52,10 @@ async def lifespan(app: FastAPI):
         sys.path.append('/app')  # Add to Python path for Railway deployment
         from detector import DeterministicPatternDetector
         from comprehensive_market_analyzer import generate_comprehensive_market_analysis
+        from jit_kernels import warm_up, HAVE_NUMBA
+        warm_up()
         logger.info("✅ Mathematical analysis components loaded successfully")
+        logger.info(f"⚡ JIT analysis kernels: {'✅ COMPILED' if HAVE_NUMBA else '➖ pure Python'}")
         logger.info("🔬 Advanced pattern detection: ✅ ENABLED")
         logger.info("📊 Comprehensive market analysis: ✅ ENABLED") 
         logger.info("🧮 13+ Mathematical indicators: ✅ ENABLED")
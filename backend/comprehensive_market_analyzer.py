@@ -1,10 +1,121 @@
 import numpy as np
 import pandas as pd
-import json
+from numpy.lib.stride_tricks import sliding_window_view
+from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
-from detector import NpEncoder, TrendlineEngine
+from typing import Optional
+from detector import TrendlineEngine
+from jit_kernels import scan_flags, scan_flags_batch, detect_swings
+from analysis_utils import dump_analysis, run_in_chunks
 import logging
 
+logger = logging.getLogger(__name__)
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+class PivotArray:
+    """
+    Peaks or valleys stored column-wise (SoA) as parallel NumPy arrays.
+
+    Integer indexing returns the legacy pivot dict on demand so consumers that
+    read p['price'] / p['date'] keep working; slices, index arrays and boolean
+    masks return a new PivotArray.
+    """
+
+    def __init__(self, indices, dates, prices, pivot_type, date_strs=None):
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.dates = dates  # DatetimeIndex aligned with indices
+        self.dates_ns = dates.values.astype('datetime64[ns]').view(np.int64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.pivot_type = pivot_type
+        # Formatted once here so the JSON builders never call strftime per touch
+        self.date_strs = np.asarray(dates.strftime("%Y-%m-%d"), dtype=object) if date_strs is None else date_strs
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return {
+                'index': int(self.indices[key]),
+                'date': self.dates[key],
+                'price': float(self.prices[key]),
+                'type': self.pivot_type,
+                'date_str': self.date_strs[key]
+            }
+        return PivotArray(self.indices[key], self.dates[key], self.prices[key], self.pivot_type,
+                          self.date_strs[key])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def extreme_between(self, start_ns, end_ns, lowest=True):
+        """Return the lowest (or highest) pivot strictly between two int64 ns dates, or None."""
+        # dates_ns is sorted, so the open interval is a contiguous slice
+        lo = np.searchsorted(self.dates_ns, start_ns, side='right')
+        hi = np.searchsorted(self.dates_ns, end_ns, side='left')
+        if lo >= hi:
+            return None
+        prices = self.prices[lo:hi]
+        pos = np.argmin(prices) if lowest else np.argmax(prices)
+        return self[lo + pos]
+
+
+@dataclass(slots=True)
+class TrendlineRecord:
+    """JSON-facing trendline row; converted with asdict() only at the analysis boundary."""
+    trendline_id: str
+    type: str
+    direction: str
+    current_value: float
+    slope: float
+    touches: int
+    strength: str
+    touch_points: list
+    distance_from_current: float
+    distance_percent: float
+    trading_relevance: str
+    forward_projections: dict
+    days_to_intersection: Optional[int]
+    significance: str
+
+
+@dataclass(slots=True)
+class TriangleRecord:
+    """JSON-facing triangle pattern; converted with asdict() in detect_chart_patterns."""
+    pattern_name: str
+    pattern_type: str
+    bias: str
+    reliability_score: float
+    status: str
+    formation_start: str
+    apex_date: str
+    time_to_apex_days: float
+    resistance_trendline: dict
+    support_trendline: dict
+    trading_setup: dict
+    expected_direction: str
+
+
+@dataclass(slots=True)
+class FlagRecord:
+    """JSON-facing flag pattern; converted with asdict() in detect_chart_patterns."""
+    pattern_name: str
+    pattern_type: str
+    bias: str
+    reliability_score: float
+    status: str
+    pole_start: str
+    pole_end: str
+    flag_end: str
+    pole_change_percent: float
+    flag_range_percent: float
+    trading_setup: dict
+    pattern_structure: dict
+
+
 class ComprehensiveMarketAnalyzer:
     """
     Complete market analyzer that combines:
@@ -14,6 +125,54 @@ class ComprehensiveMarketAnalyzer:
     4. Fibonacci Analysis (retracements and extensions)
     """
     
+    # Triangle classification indexed by (ascending << 2) | (descending << 1) | symmetrical.
+    # Ascending takes precedence over descending, which takes precedence over symmetrical;
+    # 110/111 cannot occur since resistance cannot be both flat and falling.
+    TRIANGLE_TYPES = (
+        None,
+        ("Symmetrical Triangle", "Neutral (Direction depends on breakout)", 0.68),
+        ("Descending Triangle", "Bearish", 0.72),
+        ("Descending Triangle", "Bearish", 0.72),
+        ("Ascending Triangle", "Bullish", 0.75),
+        ("Ascending Triangle", "Bullish", 0.75),
+        None,
+        None
+    )
+    
+    # Optional analysis components: include name -> (result key, summary label)
+    ANALYSIS_COMPONENTS = {
+        'trendlines': ("trendline_analysis", "Trendlines"),
+        'patterns': ("chart_patterns", "Chart Patterns"),
+        'volume': ("volume_analysis", "Volume Analysis"),
+        'fibonacci': ("fibonacci_analysis", "Fibonacci Levels")
+    }
+    
+    # Volume buckets from _classify: (assessment, significance) and trend labels, lowest first
+    VOLUME_LEVELS = (
+        ("Low", "Below normal activity"),
+        ("Normal", "Average trading activity"),
+        ("High", "Above normal activity"),
+        ("Extremely High", "Major institutional activity")
+    )
+    VOLUME_TRENDS = ("Strongly Decreasing", "Decreasing", "Stable", "Increasing", "Strongly Increasing")
+    
+    # Fibonacci retracement ratios (<= 1.0) followed by extension ratios
+    FIB_RATIOS = np.array([0.0, 0.236, 0.382, 0.500, 0.618, 0.786, 1.0,
+                           1.272, 1.414, 1.618, 2.0, 2.618])
+    FIB_SIGNIFICANCE = {
+        0.236: "Shallow retracement - strong trend",
+        0.382: "Moderate retracement - common level",
+        0.500: "Half retracement - psychological level",
+        0.618: "Golden ratio - key reversal level",
+        0.786: "Deep retracement - trend weakness"
+    }
+    EXTENSION_SIGNIFICANCE = {
+        1.272: "Common first target",
+        1.414: "Secondary target level",
+        1.618: "Golden ratio target - major level",
+        2.0: "Double extension - psychological target"
+    }
+    
     def __init__(self, df, symbol="UNKNOWN", analysis_window=60):
         self.symbol = symbol
         self.analysis_window = analysis_window
@@ -22,6 +181,14 @@ class ComprehensiveMarketAnalyzer:
         self.df = df.tail(analysis_window * 2)  # Extra buffer for calculations
         self.current_df = df.tail(analysis_window)  # Main analysis window
         
+        # NumPy arrays of the analysis window, read by every analysis method instead of current_df
+        self._dates = self.current_df.index
+        self._close_values = self.current_df['close'].to_numpy(dtype=np.float64)
+        self._high_values = self.current_df['high'].to_numpy(dtype=np.float64)
+        self._low_values = self.current_df['low'].to_numpy(dtype=np.float64)
+        self._volume_values = (self.current_df['volume'].to_numpy(dtype=np.float64)
+                               if 'volume' in self.current_df.columns else None)
+        
         self.current_price = df['close'].iloc[-1]
         self.current_date = df.index[-1]
         self.prices = df['close'].values
@@ -29,52 +196,78 @@ class ComprehensiveMarketAnalyzer:
         self.low = df['low'].values
         self.volume = df['volume'].values if 'volume' in df.columns else None
         
+        # Last-value moving averages, computed once and shared by the trend/Fibonacci/volume methods
+        self._sma = {w: self._last_mean(self._close_values, w) for w in (10, 20, 50)}
+        self._vol_ma = ({w: self._last_mean(self._volume_values, w) for w in (5, 20)}
+                        if self.volume is not None else {})
+        
+        # Trendline fits keyed by the pivot set they were computed from
+        self._trendline_cache = {}
+        
+        # Flag scan results, precomputed for the whole universe by analyze_universe()
+        self._flag_candidates = None
+        
         # Initialize components
         self._detect_peaks_valleys()
         
+    def _tail_hlc(self, n):
+        """High, low and close of the last n bars as views of the cached window arrays."""
+        return self._high_values[-n:], self._low_values[-n:], self._close_values[-n:]
+    
+    @staticmethod
+    def _classify(value, lower, upper):
+        """
+        Bucket index of value against ascending thresholds. Each lower threshold it is
+        strictly below and each upper threshold it is strictly above moves it one bucket
+        out from the neutral bucket len(lower); NaN anywhere lands in the neutral bucket.
+        """
+        thresholds = np.array(lower + upper, dtype=np.float64)
+        if np.isnan(value) or np.isnan(thresholds).any():
+            return len(lower)
+        return int(np.searchsorted(thresholds[:len(lower)], value, side='right')
+                   + np.searchsorted(thresholds[len(lower):], value, side='left'))
+    
+    @staticmethod
+    def _last_mean(values, window):
+        """
+        Final value of a rolling(window).mean() over values without the full rolling pass.
+
+        NaN if values is shorter than window or a bar in the window is missing, as rolling() gives.
+        """
+        return values[-window:].mean() if len(values) >= window else np.nan
+    
     def _detect_peaks_valleys(self):
         """Detect peaks and valleys for trendline and pattern analysis."""
         from scipy import signal
         
-        # Use recent data for pivot detection
-        recent_data = self.current_df.copy()
-        
-        # Gaussian smooth for better pivot detection
+        # Gaussian smooth for better pivot detection (returns fresh arrays)
         from scipy.ndimage import gaussian_filter1d
-        smoothed_high = gaussian_filter1d(recent_data['high'].values, sigma=1.5)
-        smoothed_low = gaussian_filter1d(recent_data['low'].values, sigma=1.5)
+        smoothed_high = gaussian_filter1d(self._high_values, sigma=1.5)
+        smoothed_low = gaussian_filter1d(self._low_values, sigma=1.5)
         
         # Find peaks and valleys
         peak_indices, _ = signal.find_peaks(smoothed_high, distance=5, prominence=0.5)
         valley_indices, _ = signal.find_peaks(-smoothed_low, distance=5, prominence=0.5)
         
-        # Convert to dictionary format
-        self.peaks = []
-        for idx in peak_indices:
-            if idx < len(recent_data):
-                self.peaks.append({
-                    'index': idx,
-                    'date': recent_data.index[idx],
-                    'price': recent_data['high'].iloc[idx],
-                    'type': 'high'
-                })
-        
-        self.valleys = []
-        for idx in valley_indices:
-            if idx < len(recent_data):
-                self.valleys.append({
-                    'index': idx,
-                    'date': recent_data.index[idx],
-                    'price': recent_data['low'].iloc[idx],
-                    'type': 'low'
-                })
+        # Store pivots column-wise (SoA)
+        self.peaks = PivotArray(peak_indices, self._dates[peak_indices],
+                                self._high_values[peak_indices], 'high')
+        self.valleys = PivotArray(valley_indices, self._dates[valley_indices],
+                                  self._low_values[valley_indices], 'low')
         
-        # Sort by date
-        self.peaks = sorted(self.peaks, key=lambda x: x['date'])
-        self.valleys = sorted(self.valleys, key=lambda x: x['date'])
+        # find_peaks returns strictly increasing indices, so pivots are already date-ordered
+        assert np.all(np.diff(peak_indices) > 0) and np.all(np.diff(valley_indices) > 0)
         
         logging.info(f"Detected {len(self.peaks)} peaks and {len(self.valleys)} valleys for {self.symbol}")
     
+    def _find_trendlines(self, peaks, valleys):
+        """Fit resistance and support lines once per distinct pivot set."""
+        key = (peaks.indices.tobytes(), valleys.indices.tobytes())
+        if key not in self._trendline_cache:
+            trendline_engine = TrendlineEngine(peaks, valleys, self._close_values)
+            self._trendline_cache[key] = trendline_engine.find_all_trendlines(min_touches=2)
+        return self._trendline_cache[key]
+    
     def analyze_trendlines(self):
         """Forward-looking trendline analysis for current trading decisions."""
         
@@ -83,156 +276,122 @@ class ComprehensiveMarketAnalyzer:
         
         # Focus on RECENT swing points for forward-looking analysis
         lookback_days = 60  # Only consider swings from last 60 days
-        recent_cutoff = self.current_df.index[-lookback_days] if len(self.current_df) >= lookback_days else self.current_df.index[0]
+        recent_cutoff = self._dates[-lookback_days] if len(self._dates) >= lookback_days else self._dates[0]
         
-        recent_peaks = [p for p in self.peaks if p['date'] >= recent_cutoff]
-        recent_valleys = [v for v in self.valleys if v['date'] >= recent_cutoff]
+        cutoff_ns = recent_cutoff.value
+        recent_peaks = self.peaks[self.peaks.dates_ns >= cutoff_ns]
+        recent_valleys = self.valleys[self.valleys.dates_ns >= cutoff_ns]
         
         if len(recent_peaks) < 2 or len(recent_valleys) < 2:
             # Fallback to all available data if insufficient recent swings
             recent_peaks = self.peaks[-4:] if len(self.peaks) >= 4 else self.peaks
             recent_valleys = self.valleys[-4:] if len(self.valleys) >= 4 else self.valleys
         
-        # Use TrendlineEngine with recent swing points only
-        trendline_engine = TrendlineEngine(recent_peaks, recent_valleys, self.current_df['close'].values)
-        
-        # Get best support and resistance lines (minimum 2 touches)
-        resistance_lines = trendline_engine.find_best_trendlines(is_resistance=True, min_touches=2)
-        support_lines = trendline_engine.find_best_trendlines(is_resistance=False, min_touches=2)
+        # Get best support and resistance lines (minimum 2 touches) from recent swing points only
+        resistance_lines, support_lines = self._find_trendlines(recent_peaks, recent_valleys)
         
         trendlines = []
-        current_date_index = len(self.current_df) - 1
+        current_date_index = len(self._dates) - 1
         
-        # Process resistance trendlines with forward-looking perspective
-        for i, res_line in enumerate(resistance_lines[:3]):
-            # Current trendline value (today)
-            current_value = res_line['slope'] * current_date_index + res_line['intercept']
-            
-            # Future trendline values (1, 7, 30 days ahead)
-            future_1d = res_line['slope'] * (current_date_index + 1) + res_line['intercept']
-            future_7d = res_line['slope'] * (current_date_index + 7) + res_line['intercept']
-            future_30d = res_line['slope'] * (current_date_index + 30) + res_line['intercept']
+        trendlines.extend(self._build_trendline_records(resistance_lines[:3], "Resistance", "RES", current_date_index))
+        trendlines.extend(self._build_trendline_records(support_lines[:3], "Support", "SUP", current_date_index))
+        
+        # Sort by trading relevance (High first, then by proximity to current price)
+        relevance_priority = {"High": 0, "Medium": 1, "Low": 2}
+        
+        def sort_key(trendline):
+            return (relevance_priority.get(trendline.trading_relevance.split(' - ', 1)[0], 3), 
+                   trendline.distance_percent)
+        
+        trendlines = sorted(trendlines, key=sort_key)
+        
+        return {
+            "trendlines": [asdict(t) for t in trendlines],
+            "trendline_summary": {
+                "total_trendlines": len(trendlines),
+                "resistance_lines": len([t for t in trendlines if t.type == 'Resistance']),
+                "support_lines": len([t for t in trendlines if t.type == 'Support']),
+                "strong_lines": len([t for t in trendlines if t.strength == 'Strong']),
+                "high_relevance_lines": len([t for t in trendlines if t.trading_relevance.startswith('High')])
+            }
+        }
+    
+    def _build_trendline_records(self, lines, kind, prefix, current_date_index):
+        """Build forward-looking trendline records for one side (Resistance or Support)."""
+        records = []
+        if not lines:
+            return records
+        
+        cp = self.current_price
+        
+        # Trendline values today and 1, 7, 30 days ahead for every line at once
+        slopes = np.array([line['slope'] for line in lines], dtype=np.float64)
+        intercepts = np.array([line['intercept'] for line in lines], dtype=np.float64)
+        horizons = current_date_index + np.array([0, 1, 7, 30])
+        projections = slopes[:, None] * horizons + intercepts[:, None]
+        distances = np.abs(projections[:, 0] - cp)
+        distance_pcts = distances / cp * 100
+        
+        # Round once in bulk; plain Python floats go straight into the records
+        rounded_projections = np.round(projections, 2).tolist()
+        rounded_slopes = np.round(slopes, 4).tolist()
+        rounded_distances = np.round(distances, 2).tolist()
+        rounded_pcts = np.round(distance_pcts, 2).tolist()
+        
+        for i, line in enumerate(lines):
+            slope = line['slope']
+            intercept = line['intercept']
+            current_value, future_1d, future_7d, future_30d = rounded_projections[i]
             
-            touches = res_line['touches']
-            direction = "Rising" if res_line['slope'] > 0 else "Falling" if res_line['slope'] < 0 else "Flat"
+            touches = line['touches']
+            n_touches = len(touches)
+            direction = "Rising" if slope > 0 else "Falling" if slope < 0 else "Flat"
             
             # Calculate days until trendline intersects with current price (if trending toward price)
             days_to_intersection = None
-            if abs(res_line['slope']) > 0.01:  # Avoid division by very small slopes
-                intersection_x = (self.current_price - res_line['intercept']) / res_line['slope']
+            if abs(slope) > 0.01:  # Avoid division by very small slopes
+                intersection_x = (cp - intercept) / slope
                 days_to_intersection = max(0, int(intersection_x - current_date_index))
                 if days_to_intersection > 365:  # Cap at 1 year
                     days_to_intersection = None
             
             # Determine relevance for trading (how soon will price interact with this trendline)
-            distance_pct = abs(current_value - self.current_price) / self.current_price * 100
-            if distance_pct <= 5.0:
-                trading_relevance = "High - Price close to trendline"
-            elif distance_pct <= 15.0:
-                trading_relevance = "Medium - Trendline within reach"
-            else:
-                trading_relevance = "Low - Trendline distant from current price"
-            
-            trendlines.append({
-                "trendline_id": f"RES_{i+1:02d}",
-                "type": "Resistance",
-                "direction": direction,
-                "current_value": round(current_value, 2),
-                "slope": round(res_line['slope'], 4),
-                "touches": len(touches),
-                "strength": "Strong" if len(touches) >= 3 else "Medium",
-                "touch_points": [
-                    {
-                        "date": touch['date'].strftime("%Y-%m-%d"),
-                        "price": round(touch['price'], 2)
-                    } for touch in touches[:4]  # Recent touch points
-                ],
-                "distance_from_current": round(abs(current_value - self.current_price), 2),
-                "distance_percent": round(distance_pct, 2),
-                "trading_relevance": trading_relevance,
-                "forward_projections": {
-                    "1_day_ahead": round(future_1d, 2),
-                    "7_days_ahead": round(future_7d, 2),
-                    "30_days_ahead": round(future_30d, 2)
-                },
-                "days_to_intersection": days_to_intersection,
-                "significance": f"{direction} resistance - {trading_relevance.split(' - ')[1]}"
-            })
-        
-        # Process support trendlines with forward-looking perspective
-        for i, sup_line in enumerate(support_lines[:3]):
-            # Current trendline value (today)
-            current_value = sup_line['slope'] * current_date_index + sup_line['intercept']
-            
-            # Future trendline values (1, 7, 30 days ahead)
-            future_1d = sup_line['slope'] * (current_date_index + 1) + sup_line['intercept']
-            future_7d = sup_line['slope'] * (current_date_index + 7) + sup_line['intercept']
-            future_30d = sup_line['slope'] * (current_date_index + 30) + sup_line['intercept']
-            
-            touches = sup_line['touches']
-            direction = "Rising" if sup_line['slope'] > 0 else "Falling" if sup_line['slope'] < 0 else "Flat"
-            
-            # Calculate days until trendline intersects with current price
-            days_to_intersection = None
-            if abs(sup_line['slope']) > 0.01:
-                intersection_x = (self.current_price - sup_line['intercept']) / sup_line['slope']
-                days_to_intersection = max(0, int(intersection_x - current_date_index))
-                if days_to_intersection > 365:
-                    days_to_intersection = None
-            
-            # Determine trading relevance
-            distance_pct = abs(current_value - self.current_price) / self.current_price * 100
+            distance_pct = distance_pcts[i]
             if distance_pct <= 5.0:
                 trading_relevance = "High - Price close to trendline"
             elif distance_pct <= 15.0:
                 trading_relevance = "Medium - Trendline within reach"
             else:
                 trading_relevance = "Low - Trendline distant from current price"
+            relevance_note = trading_relevance.split(' - ', 1)[1]
             
-            trendlines.append({
-                "trendline_id": f"SUP_{i+1:02d}",
-                "type": "Support",
-                "direction": direction,
-                "current_value": round(current_value, 2),
-                "slope": round(sup_line['slope'], 4),
-                "touches": len(touches),
-                "strength": "Strong" if len(touches) >= 3 else "Medium",
-                "touch_points": [
+            records.append(TrendlineRecord(
+                trendline_id=f"{prefix}_{i+1:02d}",
+                type=kind,
+                direction=direction,
+                current_value=current_value,
+                slope=rounded_slopes[i],
+                touches=n_touches,
+                strength="Strong" if n_touches >= 3 else "Medium",
+                touch_points=[
                     {
-                        "date": touch['date'].strftime("%Y-%m-%d"),
+                        "date": touch['date_str'],
                         "price": round(touch['price'], 2)
                     } for touch in touches[:4]  # Recent touch points
                 ],
-                "distance_from_current": round(abs(current_value - self.current_price), 2),
-                "distance_percent": round(distance_pct, 2),
-                "trading_relevance": trading_relevance,
-                "forward_projections": {
-                    "1_day_ahead": round(future_1d, 2),
-                    "7_days_ahead": round(future_7d, 2),
-                    "30_days_ahead": round(future_30d, 2)
+                distance_from_current=rounded_distances[i],
+                distance_percent=rounded_pcts[i],
+                trading_relevance=trading_relevance,
+                forward_projections={
+                    "1_day_ahead": future_1d,
+                    "7_days_ahead": future_7d,
+                    "30_days_ahead": future_30d
                 },
-                "days_to_intersection": days_to_intersection,
-                "significance": f"{direction} support - {trading_relevance.split(' - ')[1]}"
-            })
-        
-        # Sort by trading relevance (High first, then by proximity to current price)
-        def sort_key(trendline):
-            relevance_priority = {"High": 0, "Medium": 1, "Low": 2}
-            return (relevance_priority.get(trendline['trading_relevance'].split(' - ')[0], 3), 
-                   trendline['distance_percent'])
-        
-        trendlines = sorted(trendlines, key=sort_key)
+                days_to_intersection=days_to_intersection,
+                significance=f"{direction} {kind.lower()} - {relevance_note}"
+            ))
         
-        return {
-            "trendlines": trendlines,
-            "trendline_summary": {
-                "total_trendlines": len(trendlines),
-                "resistance_lines": len([t for t in trendlines if t['type'] == 'Resistance']),
-                "support_lines": len([t for t in trendlines if t['type'] == 'Support']),
-                "strong_lines": len([t for t in trendlines if t['strength'] == 'Strong']),
-                "high_relevance_lines": len([t for t in trendlines if t['trading_relevance'].startswith('High')])
-            }
-        }
+        return records
     
     def detect_chart_patterns(self):
         """Detect comprehensive chart patterns."""
@@ -241,11 +400,11 @@ class ComprehensiveMarketAnalyzer:
         
         # 1. Triangle Patterns
         triangle_patterns = self._detect_triangles()
-        patterns.extend(triangle_patterns)
+        patterns.extend(asdict(record) for record in triangle_patterns)
         
         # 2. Flag Patterns
         flag_patterns = self._detect_flags()
-        patterns.extend(flag_patterns)
+        patterns.extend(asdict(record) for record in flag_patterns)
         
         # 3. Head and Shoulders
         hs_patterns = self._detect_head_shoulders()
@@ -260,9 +419,10 @@ class ComprehensiveMarketAnalyzer:
         patterns.extend(breakout_patterns)
         
         # Add pattern metadata
+        analysis_date = self.current_date.strftime("%Y-%m-%d")
         for i, pattern in enumerate(patterns):
             pattern['pattern_id'] = f"PATTERN_{i+1:03d}"
-            pattern['analysis_date'] = self.current_date.strftime("%Y-%m-%d")
+            pattern['analysis_date'] = analysis_date
             pattern['current_price'] = self.current_price
         
         return patterns
@@ -274,11 +434,9 @@ class ComprehensiveMarketAnalyzer:
             return []
         
         patterns = []
-        trendline_engine = TrendlineEngine(self.peaks, self.valleys, self.current_df['close'].values)
         
         # Get recent trendlines
-        resistance_lines = trendline_engine.find_best_trendlines(is_resistance=True)
-        support_lines = trendline_engine.find_best_trendlines(is_resistance=False)
+        resistance_lines, support_lines = self._find_trendlines(self.peaks, self.valleys)
         
         if not resistance_lines or not support_lines:
             return patterns
@@ -296,56 +454,49 @@ class ComprehensiveMarketAnalyzer:
                 apex_x = (sup_line['intercept'] - res_line['intercept']) / (res_slope - sup_slope)
                 apex_y = res_slope * apex_x + res_line['intercept']
                 
-                current_x = len(self.current_df) - 1
+                current_x = len(self._dates) - 1
                 time_to_apex = apex_x - current_x
                 
                 # Only consider patterns where apex is in the future (active patterns)
                 if time_to_apex > 0 and time_to_apex < 30:  # Within 30 days
                     
-                    # Classify triangle type
+                    # Classify triangle type with a single table lookup
                     flat_tolerance = 0.1
                     
-                    if abs(res_slope) < flat_tolerance and sup_slope > 0.1:
-                        pattern_type = "Ascending Triangle"
-                        bias = "Bullish"
-                        reliability = 0.75
-                    elif res_slope < -0.1 and abs(sup_slope) < flat_tolerance:
-                        pattern_type = "Descending Triangle"
-                        bias = "Bearish"
-                        reliability = 0.72
-                    elif res_slope < 0 and sup_slope > 0 and res_slope < sup_slope:
-                        pattern_type = "Symmetrical Triangle"
-                        bias = "Neutral (Direction depends on breakout)"
-                        reliability = 0.68
-                    else:
+                    is_ascending = (abs(res_slope) < flat_tolerance) & (sup_slope > 0.1)
+                    is_descending = (res_slope < -0.1) & (abs(sup_slope) < flat_tolerance)
+                    is_symmetrical = (res_slope < 0) & (sup_slope > 0) & (res_slope < sup_slope)
+                    triangle = self.TRIANGLE_TYPES[(is_ascending << 2) | (is_descending << 1) | is_symmetrical]
+                    if triangle is None:
                         continue
+                    pattern_type, bias, reliability = triangle
                     
-                    # Get all touch points
-                    all_touches = res_line['touches'] + sup_line['touches']
-                    start_date = min(touch['date'] for touch in all_touches)
+                    # Touches are date-sorted, so the formation starts at the earlier first touch
+                    # (ISO date strings order the same way as the dates themselves)
+                    start_date = min(res_line['touches'][0]['date_str'], sup_line['touches'][0]['date_str'])
                     
-                    patterns.append({
-                        'pattern_name': pattern_type,
-                        'pattern_type': 'Triangle Pattern',
-                        'bias': bias,
-                        'reliability_score': reliability,
-                        'status': 'Currently Active',
-                        'formation_start': start_date.strftime("%Y-%m-%d"),
-                        'apex_date': (self.current_date + timedelta(days=int(time_to_apex))).strftime("%Y-%m-%d"),
-                        'time_to_apex_days': round(time_to_apex, 1),
-                        'resistance_trendline': {
+                    patterns.append(TriangleRecord(
+                        pattern_name=pattern_type,
+                        pattern_type='Triangle Pattern',
+                        bias=bias,
+                        reliability_score=reliability,
+                        status='Currently Active',
+                        formation_start=start_date,
+                        apex_date=(self.current_date + timedelta(days=int(time_to_apex))).strftime("%Y-%m-%d"),
+                        time_to_apex_days=round(time_to_apex, 1),
+                        resistance_trendline={
                             'slope': res_slope,
                             'current_value': res_slope * current_x + res_line['intercept'],
                             'touches': len(res_line['touches'])
                         },
-                        'support_trendline': {
+                        support_trendline={
                             'slope': sup_slope,
                             'current_value': sup_slope * current_x + sup_line['intercept'],
                             'touches': len(sup_line['touches'])
                         },
-                        'trading_setup': self._generate_triangle_trading_setup(pattern_type, res_line, sup_line, current_x),
-                        'expected_direction': f"Breakout expected in {int(time_to_apex)} days"
-                    })
+                        trading_setup=self._generate_triangle_trading_setup(pattern_type, res_line, sup_line, current_x),
+                        expected_direction=f"Breakout expected in {int(time_to_apex)} days"
+                    ))
         
         return patterns
     
@@ -356,91 +507,93 @@ class ComprehensiveMarketAnalyzer:
         support_level = sup_line['slope'] * current_x + sup_line['intercept']
         
         triangle_height = resistance_level - support_level
+        projection = triangle_height * 0.618  # 61.8% projection
+        risk_reward_ratio = f"1:{round(projection / triangle_height, 2)}"
         
         setup = {
             'bullish_breakout': {
                 'entry_trigger': round(resistance_level * 1.005, 2),  # 0.5% above resistance
-                'target_1': round(resistance_level + triangle_height * 0.618, 2),  # 61.8% projection
+                'target_1': round(resistance_level + projection, 2),
                 'target_2': round(resistance_level + triangle_height, 2),  # Full projection
                 'stop_loss': round(support_level * 0.99, 2),  # Below support
-                'risk_reward_ratio': f"1:{round((triangle_height * 0.618) / (resistance_level - support_level), 2)}"
+                'risk_reward_ratio': risk_reward_ratio
             },
             'bearish_breakdown': {
                 'entry_trigger': round(support_level * 0.995, 2),  # 0.5% below support
-                'target_1': round(support_level - triangle_height * 0.618, 2),  # 61.8% projection
+                'target_1': round(support_level - projection, 2),
                 'target_2': round(support_level - triangle_height, 2),  # Full projection
                 'stop_loss': round(resistance_level * 1.01, 2),  # Above resistance
-                'risk_reward_ratio': f"1:{round((triangle_height * 0.618) / (resistance_level - support_level), 2)}"
+                'risk_reward_ratio': risk_reward_ratio
             }
         }
         
         return setup
     
+    def _flag_scan_inputs(self):
+        """Close plus 10-bar flag-window high/low over the last 40 days, as float64 arrays."""
+        high, low, close = self._tail_hlc(40)
+        
+        # Flag-window high/low for every bar (trailing 10-bar max/min, NaN until the window fills);
+        # missing bars are skipped, as the per-window Series.max()/min() did
+        window_high = np.full(len(close), np.nan)
+        window_low = np.full(len(close), np.nan)
+        if len(close) >= 10:
+            window_high[9:] = np.nanmax(sliding_window_view(high, 10), axis=1)
+            window_low[9:] = np.nanmin(sliding_window_view(low, 10), axis=1)
+        return close, window_high, window_low
+    
     def _detect_flags(self):
         """Detect flag patterns."""
         patterns = []
         
         # Look for sharp moves followed by consolidation
-        recent_data = self.current_df.tail(40)  # Last 40 days
+        recent_dates = self._dates[-40:]  # Last 40 days
         
-        if len(recent_data) < 30:
+        if len(recent_dates) < 30:
             return patterns
         
-        # Find potential flagpoles (sharp moves)
-        for i in range(15, len(recent_data) - 10):  # Pole + flag minimum length
+        # Find potential flagpoles (sharp moves) with the compiled sliding-window scan
+        close, window_high, window_low = self._flag_scan_inputs()
+        if self._flag_candidates is None:
+            self._flag_candidates = scan_flags(close, window_high, window_low)
+        
+        # Only matched candidates are formatted in Python
+        for i, pole_change, pole_change_pct, flag_range_pct, flag_high, flag_low in zip(*self._flag_candidates):
             pole_start = i - 15
             pole_end = i
-            flag_end = min(i + 10, len(recent_data) - 1)
+            flag_end = i + 10
             
-            pole_data = recent_data.iloc[pole_start:pole_end]
-            flag_data = recent_data.iloc[pole_end:flag_end]
+            pattern_type = "Bull Flag" if pole_change > 0 else "Bear Flag"
+            bias = "Bullish" if pole_change > 0 else "Bearish"
             
-            # Calculate pole characteristics
-            pole_change = (pole_data['close'].iloc[-1] - pole_data['close'].iloc[0])
-            pole_change_pct = pole_change / pole_data['close'].iloc[0] * 100
+            # Calculate targets
+            current_price = close[flag_end]
+            target_move = pole_change
+            target_price = current_price + target_move
             
-            # Check for significant pole (>3% move)
-            if abs(pole_change_pct) > 3:
-                
-                # Check flag characteristics (consolidation)
-                flag_high = flag_data['high'].max()
-                flag_low = flag_data['low'].min()
-                flag_range_pct = (flag_high - flag_low) / flag_data['close'].iloc[0] * 100
-                
-                # Flag should be smaller range than pole
-                if flag_range_pct < abs(pole_change_pct) * 0.5:
-                    
-                    pattern_type = "Bull Flag" if pole_change > 0 else "Bear Flag"
-                    bias = "Bullish" if pole_change > 0 else "Bearish"
-                    
-                    # Calculate targets
-                    current_price = recent_data['close'].iloc[flag_end]
-                    target_move = pole_change
-                    target_price = current_price + target_move
-                    
-                    patterns.append({
-                        'pattern_name': pattern_type,
-                        'pattern_type': 'Flag Pattern',
-                        'bias': bias,
-                        'reliability_score': 0.78,
-                        'status': 'Currently Forming',
-                        'pole_start': recent_data.index[pole_start].strftime("%Y-%m-%d"),
-                        'pole_end': recent_data.index[pole_end].strftime("%Y-%m-%d"),
-                        'flag_end': recent_data.index[flag_end].strftime("%Y-%m-%d"),
-                        'pole_change_percent': round(pole_change_pct, 2),
-                        'flag_range_percent': round(flag_range_pct, 2),
-                        'trading_setup': {
-                            'entry_trigger': round(flag_high * 1.002 if pole_change > 0 else flag_low * 0.998, 2),
-                            'target_price': round(target_price, 2),
-                            'stop_loss': round(flag_low * 0.98 if pole_change > 0 else flag_high * 1.02, 2),
-                            'expected_move': f"{abs(pole_change_pct):.1f}% continuation"
-                        },
-                        'pattern_structure': {
-                            'pole_height': round(abs(pole_change), 2),
-                            'flag_consolidation_range': f"{flag_low:.2f} - {flag_high:.2f}",
-                            'breakout_level': flag_high if pole_change > 0 else flag_low
-                        }
-                    })
+            patterns.append(FlagRecord(
+                pattern_name=pattern_type,
+                pattern_type='Flag Pattern',
+                bias=bias,
+                reliability_score=0.78,
+                status='Currently Forming',
+                pole_start=recent_dates[pole_start].strftime("%Y-%m-%d"),
+                pole_end=recent_dates[pole_end].strftime("%Y-%m-%d"),
+                flag_end=recent_dates[flag_end].strftime("%Y-%m-%d"),
+                pole_change_percent=round(pole_change_pct, 2),
+                flag_range_percent=round(flag_range_pct, 2),
+                trading_setup={
+                    'entry_trigger': round(flag_high * 1.002 if pole_change > 0 else flag_low * 0.998, 2),
+                    'target_price': round(target_price, 2),
+                    'stop_loss': round(flag_low * 0.98 if pole_change > 0 else flag_high * 1.02, 2),
+                    'expected_move': f"{abs(pole_change_pct):.1f}% continuation"
+                },
+                pattern_structure={
+                    'pole_height': round(abs(pole_change), 2),
+                    'flag_consolidation_range': f"{flag_low:.2f} - {flag_high:.2f}",
+                    'breakout_level': flag_high if pole_change > 0 else flag_low
+                }
+            ))
         
         return patterns
     
@@ -451,57 +604,49 @@ class ComprehensiveMarketAnalyzer:
         if len(self.peaks) < 3:
             return patterns
         
-        # Look for 3 consecutive peaks forming H&S
-        for i in range(len(self.peaks) - 2):
+        # Check H&S criteria for every run of 3 consecutive peaks at once
+        prices = self.peaks.prices
+        lefts, heads, rights = prices[:-2], prices[1:-1], prices[2:]
+        head_higher = (heads > lefts) & (heads > rights)
+        shoulders_similar = np.abs(lefts - rights) < 0.05 * lefts
+        
+        for i in np.flatnonzero(head_higher & shoulders_similar):
             left_shoulder = self.peaks[i]
             head = self.peaks[i + 1]
             right_shoulder = self.peaks[i + 2]
             
             # Find valleys between peaks
-            left_valley = None
-            right_valley = None
-            
-            for valley in self.valleys:
-                if left_shoulder['date'] < valley['date'] < head['date']:
-                    if left_valley is None or valley['price'] < left_valley['price']:
-                        left_valley = valley
-                
-                if head['date'] < valley['date'] < right_shoulder['date']:
-                    if right_valley is None or valley['price'] < right_valley['price']:
-                        right_valley = valley
+            left_valley = self.valleys.extreme_between(self.peaks.dates_ns[i], self.peaks.dates_ns[i + 1])
+            right_valley = self.valleys.extreme_between(self.peaks.dates_ns[i + 1], self.peaks.dates_ns[i + 2])
             
             if left_valley and right_valley:
-                # Check H&S criteria
-                head_higher = head['price'] > left_shoulder['price'] and head['price'] > right_shoulder['price']
-                shoulders_similar = abs(left_shoulder['price'] - right_shoulder['price']) / left_shoulder['price'] < 0.05
                 neckline_level = min(left_valley['price'], right_valley['price'])
                 
-                if head_higher and shoulders_similar:
-                    # Calculate target
-                    head_to_neckline = head['price'] - neckline_level
-                    target_price = neckline_level - head_to_neckline
-                    
-                    patterns.append({
-                        'pattern_name': 'Head and Shoulders',
-                        'pattern_type': 'Reversal Pattern',
-                        'bias': 'Bearish',
-                        'reliability_score': 0.72,
-                        'status': 'Pattern Complete - Watch for Neckline Break',
-                        'formation_start': left_shoulder['date'].strftime("%Y-%m-%d"),
-                        'formation_end': right_shoulder['date'].strftime("%Y-%m-%d"),
-                        'key_points': {
-                            'left_shoulder': {'date': left_shoulder['date'].strftime("%Y-%m-%d"), 'price': left_shoulder['price']},
-                            'head': {'date': head['date'].strftime("%Y-%m-%d"), 'price': head['price']},
-                            'right_shoulder': {'date': right_shoulder['date'].strftime("%Y-%m-%d"), 'price': right_shoulder['price']},
-                            'neckline_level': round(neckline_level, 2)
-                        },
-                        'trading_setup': {
-                            'entry_trigger': round(neckline_level * 0.995, 2),  # Break below neckline
-                            'target_price': round(target_price, 2),
-                            'stop_loss': round(right_shoulder['price'] * 1.02, 2),
-                            'measured_move': round(head_to_neckline, 2)
-                        }
-                    })
+                # Calculate target
+                head_to_neckline = head['price'] - neckline_level
+                target_price = neckline_level - head_to_neckline
+                
+                patterns.append({
+                    'pattern_name': 'Head and Shoulders',
+                    'pattern_type': 'Reversal Pattern',
+                    'bias': 'Bearish',
+                    'reliability_score': 0.72,
+                    'status': 'Pattern Complete - Watch for Neckline Break',
+                    'formation_start': left_shoulder['date_str'],
+                    'formation_end': right_shoulder['date_str'],
+                    'key_points': {
+                        'left_shoulder': {'date': left_shoulder['date_str'], 'price': left_shoulder['price']},
+                        'head': {'date': head['date_str'], 'price': head['price']},
+                        'right_shoulder': {'date': right_shoulder['date_str'], 'price': right_shoulder['price']},
+                        'neckline_level': round(neckline_level, 2)
+                    },
+                    'trading_setup': {
+                        'entry_trigger': round(neckline_level * 0.995, 2),  # Break below neckline
+                        'target_price': round(target_price, 2),
+                        'stop_loss': round(right_shoulder['price'] * 1.02, 2),
+                        'measured_move': round(head_to_neckline, 2)
+                    }
+                })
         
         return patterns
     
@@ -511,20 +656,17 @@ class ComprehensiveMarketAnalyzer:
         
         # Double Tops
         if len(self.peaks) >= 2:
+            peak_gaps = np.diff(self.peaks.dates_ns) // NS_PER_DAY
             for i in range(len(self.peaks) - 1):
                 peak1 = self.peaks[i]
                 peak2 = self.peaks[i + 1]
                 
                 price_similarity = abs(peak1['price'] - peak2['price']) / peak1['price'] < 0.03  # Within 3%
-                time_gap = (peak2['date'] - peak1['date']).days
+                time_gap = peak_gaps[i]
                 
                 if price_similarity and 10 < time_gap < 60:  # Reasonable time gap
                     # Find valley between peaks
-                    valley_between = None
-                    for valley in self.valleys:
-                        if peak1['date'] < valley['date'] < peak2['date']:
-                            if valley_between is None or valley['price'] < valley_between['price']:
-                                valley_between = valley
+                    valley_between = self.valleys.extreme_between(self.peaks.dates_ns[i], self.peaks.dates_ns[i + 1])
                     
                     if valley_between:
                         valley_depth = (min(peak1['price'], peak2['price']) - valley_between['price']) / min(peak1['price'], peak2['price'])
@@ -538,12 +680,12 @@ class ComprehensiveMarketAnalyzer:
                                 'bias': 'Bearish',
                                 'reliability_score': 0.68,
                                 'status': 'Pattern Complete - Watch for Support Break',
-                                'formation_start': peak1['date'].strftime("%Y-%m-%d"),
-                                'formation_end': peak2['date'].strftime("%Y-%m-%d"),
+                                'formation_start': peak1['date_str'],
+                                'formation_end': peak2['date_str'],
                                 'key_points': {
-                                    'first_peak': {'date': peak1['date'].strftime("%Y-%m-%d"), 'price': peak1['price']},
-                                    'second_peak': {'date': peak2['date'].strftime("%Y-%m-%d"), 'price': peak2['price']},
-                                    'valley': {'date': valley_between['date'].strftime("%Y-%m-%d"), 'price': valley_between['price']}
+                                    'first_peak': {'date': peak1['date_str'], 'price': peak1['price']},
+                                    'second_peak': {'date': peak2['date_str'], 'price': peak2['price']},
+                                    'valley': {'date': valley_between['date_str'], 'price': valley_between['price']}
                                 },
                                 'trading_setup': {
                                     'entry_trigger': round(valley_between['price'] * 0.995, 2),
@@ -554,20 +696,18 @@ class ComprehensiveMarketAnalyzer:
         
         # Double Bottoms
         if len(self.valleys) >= 2:
+            valley_gaps = np.diff(self.valleys.dates_ns) // NS_PER_DAY
             for i in range(len(self.valleys) - 1):
                 valley1 = self.valleys[i]
                 valley2 = self.valleys[i + 1]
                 
                 price_similarity = abs(valley1['price'] - valley2['price']) / valley1['price'] < 0.03  # Within 3%
-                time_gap = (valley2['date'] - valley1['date']).days
+                time_gap = valley_gaps[i]
                 
                 if price_similarity and 10 < time_gap < 60:  # Reasonable time gap
                     # Find peak between valleys
-                    peak_between = None
-                    for peak in self.peaks:
-                        if valley1['date'] < peak['date'] < valley2['date']:
-                            if peak_between is None or peak['price'] > peak_between['price']:
-                                peak_between = peak
+                    peak_between = self.peaks.extreme_between(self.valleys.dates_ns[i], self.valleys.dates_ns[i + 1],
+                                                              lowest=False)
                     
                     if peak_between:
                         peak_height = (peak_between['price'] - max(valley1['price'], valley2['price'])) / max(valley1['price'], valley2['price'])
@@ -581,12 +721,12 @@ class ComprehensiveMarketAnalyzer:
                                 'bias': 'Bullish',
                                 'reliability_score': 0.70,
                                 'status': 'Pattern Complete - Watch for Resistance Break',
-                                'formation_start': valley1['date'].strftime("%Y-%m-%d"),
-                                'formation_end': valley2['date'].strftime("%Y-%m-%d"),
+                                'formation_start': valley1['date_str'],
+                                'formation_end': valley2['date_str'],
                                 'key_points': {
-                                    'first_bottom': {'date': valley1['date'].strftime("%Y-%m-%d"), 'price': valley1['price']},
-                                    'second_bottom': {'date': valley2['date'].strftime("%Y-%m-%d"), 'price': valley2['price']},
-                                    'peak': {'date': peak_between['date'].strftime("%Y-%m-%d"), 'price': peak_between['price']}
+                                    'first_bottom': {'date': valley1['date_str'], 'price': valley1['price']},
+                                    'second_bottom': {'date': valley2['date_str'], 'price': valley2['price']},
+                                    'peak': {'date': peak_between['date_str'], 'price': peak_between['price']}
                                 },
                                 'trading_setup': {
                                     'entry_trigger': round(peak_between['price'] * 1.005, 2),
@@ -602,44 +742,59 @@ class ComprehensiveMarketAnalyzer:
         patterns = []
         
         # Get recent highs and lows
-        recent_30_high = self.current_df.tail(30)['high'].max()
-        recent_30_low = self.current_df.tail(30)['low'].min()
+        recent_highs, recent_lows, _ = self._tail_hlc(30)
+        recent_30_high = np.nanmax(recent_highs)
+        recent_30_low = np.nanmin(recent_lows)
         
         # Check if current price is near breakout levels
         near_resistance = abs(self.current_price - recent_30_high) / self.current_price < 0.02  # Within 2%
         near_support = abs(self.current_price - recent_30_low) / self.current_price < 0.02  # Within 2%
         
         if near_resistance:
+            level, distance_pct, entry, target, stop = np.round([
+                recent_30_high,
+                (recent_30_high - self.current_price) / self.current_price * 100,
+                recent_30_high * 1.002,  # 0.2% above resistance
+                recent_30_high + (recent_30_high - recent_30_low) * 0.618,
+                recent_30_high * 0.98  # 2% below resistance
+            ], 2).tolist()
             patterns.append({
                 'pattern_name': 'Resistance Breakout Setup',
                 'pattern_type': 'Breakout Pattern',
                 'bias': 'Bullish (if breaks above)',
                 'reliability_score': 0.75,
                 'status': 'Currently at Resistance - Breakout Imminent',
-                'resistance_level': round(recent_30_high, 2),
-                'distance_to_breakout_pct': round((recent_30_high - self.current_price) / self.current_price * 100, 2),
+                'resistance_level': level,
+                'distance_to_breakout_pct': distance_pct,
                 'trading_setup': {
-                    'entry_trigger': round(recent_30_high * 1.002, 2),  # 0.2% above resistance
-                    'target_price': round(recent_30_high + (recent_30_high - recent_30_low) * 0.618, 2),
-                    'stop_loss': round(recent_30_high * 0.98, 2),  # 2% below resistance
+                    'entry_trigger': entry,
+                    'target_price': target,
+                    'stop_loss': stop,
                     'volume_confirmation_needed': True
                 },
                 'timeline': 'Breakout expected within 1-5 days'
             })
         
         if near_support:
+            level, distance_pct, entry, target, stop = np.round([
+                recent_30_low,
+                (self.current_price - recent_30_low) / self.current_price * 100,
+                recent_30_low * 0.998,  # 0.2% below support
+                recent_30_low - (recent_30_high - recent_30_low) * 0.618,
+                recent_30_low * 1.02  # 2% above support
+            ], 2).tolist()
             patterns.append({
                 'pattern_name': 'Support Breakdown Setup',
                 'pattern_type': 'Breakdown Pattern',
                 'bias': 'Bearish (if breaks below)',
                 'reliability_score': 0.75,
                 'status': 'Currently at Support - Breakdown Possible',
-                'support_level': round(recent_30_low, 2),
-                'distance_to_breakdown_pct': round((self.current_price - recent_30_low) / self.current_price * 100, 2),
+                'support_level': level,
+                'distance_to_breakdown_pct': distance_pct,
                 'trading_setup': {
-                    'entry_trigger': round(recent_30_low * 0.998, 2),  # 0.2% below support
-                    'target_price': round(recent_30_low - (recent_30_high - recent_30_low) * 0.618, 2),
-                    'stop_loss': round(recent_30_low * 1.02, 2),  # 2% above support
+                    'entry_trigger': entry,
+                    'target_price': target,
+                    'stop_loss': stop,
                     'volume_confirmation_needed': True
                 },
                 'timeline': 'Breakdown possible within 1-5 days'
@@ -653,53 +808,34 @@ class ComprehensiveMarketAnalyzer:
         if self.volume is None:
             return {"error": "No volume data available"}
         
-        recent_volume = self.current_df['volume']
-        current_vol = recent_volume.iloc[-1]
+        recent_volume = self._volume_values
+        current_vol = recent_volume[-1]
         avg_vol = recent_volume.mean()
-        vol_std = recent_volume.std()
+        vol_std = recent_volume.std(ddof=1) if len(recent_volume) > 1 else np.nan
         
         # Volume assessment
-        if current_vol > avg_vol + 2 * vol_std:
-            vol_assessment = "Extremely High"
-            significance = "Major institutional activity"
-        elif current_vol > avg_vol + vol_std:
-            vol_assessment = "High"
-            significance = "Above normal activity"
-        elif current_vol < avg_vol - vol_std:
-            vol_assessment = "Low"
-            significance = "Below normal activity"
-        else:
-            vol_assessment = "Normal"
-            significance = "Average trading activity"
+        vol_assessment, significance = self.VOLUME_LEVELS[self._classify(
+            current_vol, [avg_vol - vol_std], [avg_vol + vol_std, avg_vol + 2 * vol_std])]
         
         # Volume trend
-        vol_ma_5 = recent_volume.rolling(5).mean().iloc[-1]
-        vol_ma_20 = recent_volume.rolling(20).mean().iloc[-1] if len(recent_volume) >= 20 else avg_vol
-        
-        if vol_ma_5 > vol_ma_20 * 1.2:
-            vol_trend = "Strongly Increasing"
-        elif vol_ma_5 > vol_ma_20 * 1.1:
-            vol_trend = "Increasing"
-        elif vol_ma_5 < vol_ma_20 * 0.8:
-            vol_trend = "Strongly Decreasing"
-        elif vol_ma_5 < vol_ma_20 * 0.9:
-            vol_trend = "Decreasing"
-        else:
-            vol_trend = "Stable"
+        vol_ma_5 = self._vol_ma[5]
+        vol_ma_20 = self._vol_ma[20] if len(recent_volume) >= 20 else avg_vol
+        
+        vol_trend = self.VOLUME_TRENDS[self._classify(
+            vol_ma_5, [vol_ma_20 * 0.8, vol_ma_20 * 0.9], [vol_ma_20 * 1.1, vol_ma_20 * 1.2])]
         
         # Recent volume spikes
         volume_spikes = []
-        for i in range(max(0, len(recent_volume) - 10), len(recent_volume)):
-            vol = recent_volume.iloc[i]
-            z_score = (vol - avg_vol) / vol_std if vol_std > 0 else 0
-            
-            if z_score > 2:
-                volume_spikes.append({
-                    'date': recent_volume.index[i].strftime("%Y-%m-%d"),
-                    'volume': int(vol),
-                    'z_score': round(z_score, 2),
-                    'multiple_of_average': round(vol / avg_vol, 2)
-                })
+        if vol_std > 0:
+            last_vols = recent_volume[-10:]
+            z_scores = (last_vols - avg_vol) / vol_std
+            last_dates = self._dates[-10:]
+            volume_spikes = [{
+                'date': last_dates[i].strftime("%Y-%m-%d"),
+                'volume': int(last_vols[i]),
+                'z_score': round(z_scores[i], 2),
+                'multiple_of_average': round(last_vols[i] / avg_vol, 2)
+            } for i in np.flatnonzero(z_scores > 2)]
         
         return {
             "current_volume": int(current_vol),
@@ -713,13 +849,17 @@ class ComprehensiveMarketAnalyzer:
             "volume_ma_20": int(vol_ma_20)
         }
     
-    def analyze_fibonacci(self):
-        """Proper Fibonacci analysis: Swing Low = 0%, Swing High = 100%, using wicks."""
+    def analyze_fibonacci(self, full=True):
+        """
+        Proper Fibonacci analysis: Swing Low = 0%, Swing High = 100%, using wicks.
+        With full=False, a stub without levels is returned when the SMAs show no trend
+        and price is more than 15% away from both ends of its 20-day range.
+        """
         
         # Step 1: Identify current trend direction using SMA
-        sma_10 = self.current_df['close'].rolling(10).mean().iloc[-1]
-        sma_20 = self.current_df['close'].rolling(20).mean().iloc[-1]
-        sma_50 = self.current_df['close'].rolling(50).mean().iloc[-1]
+        sma_10 = self._sma[10]
+        sma_20 = self._sma[20]
+        sma_50 = self._sma[50]
         
         # Determine trend based on SMA alignment and price position
         if self.current_price > sma_10 > sma_20 > sma_50:
@@ -728,8 +868,23 @@ class ComprehensiveMarketAnalyzer:
             current_trend = "downtrend"
         else:
             # Use recent price action to determine trend
-            recent_high = self.current_df['high'].tail(20).max()
-            recent_low = self.current_df['low'].tail(20).min()
+            recent_highs, recent_lows, _ = self._tail_hlc(20)
+            recent_high = np.nanmax(recent_highs)
+            recent_low = np.nanmin(recent_lows)
+            
+            # Fast path for callers that do not need the levels: no swing is close enough to matter
+            if not full and min(abs(self.current_price - recent_high),
+                                abs(self.current_price - recent_low)) / self.current_price > 0.15:
+                return {
+                    "fibonacci_analysis": {
+                        "trend_direction": "sideways",
+                        "skipped": True,
+                        "swing_detection": "Skipped: no SMA trend and price far from the 20-day high/low"
+                    },
+                    "key_levels": [],
+                    "nearest_level": None
+                }
+            
             if self.current_price > (recent_high + recent_low) / 2:
                 current_trend = "uptrend"
             else:
@@ -738,51 +893,41 @@ class ComprehensiveMarketAnalyzer:
         # Step 2: Go back from current date to find swing high and swing low using wicks
         # Find all potential swings within lookback period, working backwards from current date
         lookback_days = 60
-        lookback_data = self.current_df.tail(lookback_days)
+        lookback_dates = self._dates[-lookback_days:]
         
         # Find swing highs and lows using wicks (high/low prices)
-        swing_highs = []
-        swing_lows = []
-        
-        # Look for swings, excluding the very recent days to avoid incomplete patterns
-        for i in range(5, len(lookback_data) - 3):  # Leave 3 days buffer from current
-            high_price = lookback_data['high'].iloc[i]
-            low_price = lookback_data['low'].iloc[i]
-            swing_date = lookback_data.index[i]
-            
-            # Check if it's a swing high (higher than surrounding 5 days on each side)
-            is_swing_high = all(high_price >= lookback_data['high'].iloc[i-j] for j in range(1, 6)) and \
-                           all(high_price >= lookback_data['high'].iloc[i+j] for j in range(1, 6))
-            
-            # Check if it's a swing low (lower than surrounding 5 days on each side) 
-            is_swing_low = all(low_price <= lookback_data['low'].iloc[i-j] for j in range(1, 6)) and \
-                          all(low_price <= lookback_data['low'].iloc[i+j] for j in range(1, 6))
-            
-            if is_swing_high:
-                swing_highs.append({
-                    'price': high_price,
-                    'date': swing_date,
-                    'index': i
-                })
-            
-            if is_swing_low:
-                swing_lows.append({
-                    'price': low_price,
-                    'date': swing_date, 
-                    'index': i
-                })
+        highs, lows, _ = self._tail_hlc(lookback_days)
+        
+        # A swing high (low) is at least as high (low) as the surrounding 5 days on each side;
+        # the last 5 bars never qualify, which also keeps a buffer from the current date
+        swing_high_indices, swing_low_indices = detect_swings(highs, lows, 5)
+        
+        # 'index' is the bar position in the analysis window, so swings order by plain int compares
+        offset = len(self._dates) - len(highs)
+        swing_highs = [{
+            'price': highs[i],
+            'date': lookback_dates[i],
+            'index': int(i) + offset
+        } for i in swing_high_indices]
+        
+        swing_lows = [{
+            'price': lows[i],
+            'date': lookback_dates[i],
+            'index': int(i) + offset
+        } for i in swing_low_indices]
         
         # Step 3: Select swing pair using new logic - work backwards from current date
         if not swing_highs or not swing_lows:
             # Fallback if no clear swings found
-            recent_data = self.current_df.tail(30)
+            recent_dates = self._dates[-30:]
+            recent_highs, recent_lows, _ = self._tail_hlc(30)
             swing_high = {
-                'price': recent_data['high'].max(),
-                'date': recent_data['high'].idxmax()
+                'price': np.nanmax(recent_highs),
+                'date': recent_dates[np.nanargmax(recent_highs)]
             }
             swing_low = {
-                'price': recent_data['low'].min(), 
-                'date': recent_data['low'].idxmin()
+                'price': np.nanmin(recent_lows), 
+                'date': recent_dates[np.nanargmin(recent_lows)]
             }
         else:
             if current_trend == "uptrend":
@@ -791,33 +936,32 @@ class ComprehensiveMarketAnalyzer:
                 # 2. Find first swing high before that swing low
                 
                 # Check if current date itself is a swing low
-                current_date = self.current_df.index[-1]
-                current_low_price = self.current_df['low'].iloc[-1]
+                current_date = self._dates[-1]
+                current_low_price = self._low_values[-1]
                 
                 # See if current price area could be considered a swing low
-                recent_lows = self.current_df['low'].tail(10)  # Last 10 days
-                is_current_area_low = current_low_price <= recent_lows.min() * 1.02  # Within 2% of recent low
+                recent_lows = self._low_values[-10:]  # Last 10 days
+                is_current_area_low = current_low_price <= np.nanmin(recent_lows) * 1.02  # Within 2% of recent low
                 
                 if is_current_area_low:
                     # Current area is the swing low - use it
                     first_swing_low = {
                         'price': current_low_price,
                         'date': current_date,
-                        'index': len(self.current_df) - 1
+                        'index': len(self._dates) - 1
                     }
                 else:
                     # Find first swing low going backwards from current date
-                    swing_lows_by_date = sorted(swing_lows, key=lambda x: x['date'], reverse=True)
-                    first_swing_low = swing_lows_by_date[0]  # Most recent swing low
+                    first_swing_low = max(swing_lows, key=lambda x: x['index'])  # Most recent swing low
                 
                 # Now find first swing high before this swing low
-                swing_highs_before = [sh for sh in swing_highs if sh['date'] < first_swing_low['date']]
+                swing_highs_before = [sh for sh in swing_highs if sh['index'] < first_swing_low['index']]
                 if swing_highs_before:
                     # Get the swing high closest to (but before) the swing low
-                    swing_high = max(swing_highs_before, key=lambda x: x['date'])
+                    swing_high = max(swing_highs_before, key=lambda x: x['index'])
                 else:
                     # Fallback: use any swing high we have
-                    swing_high = max(swing_highs, key=lambda x: x['date'])
+                    swing_high = max(swing_highs, key=lambda x: x['index'])
                 
                 swing_low = first_swing_low
                     
@@ -827,33 +971,32 @@ class ComprehensiveMarketAnalyzer:
                 # 2. Find first swing low before that swing high
                 
                 # Check if current date itself is a swing high
-                current_date = self.current_df.index[-1]
-                current_high_price = self.current_df['high'].iloc[-1]
+                current_date = self._dates[-1]
+                current_high_price = self._high_values[-1]
                 
                 # See if current price area could be considered a swing high
-                recent_highs = self.current_df['high'].tail(10)  # Last 10 days
-                is_current_area_high = current_high_price >= recent_highs.max() * 0.98  # Within 2% of recent high
+                recent_highs = self._high_values[-10:]  # Last 10 days
+                is_current_area_high = current_high_price >= np.nanmax(recent_highs) * 0.98  # Within 2% of recent high
                 
                 if is_current_area_high:
                     # Current area is the swing high - use it
                     first_swing_high = {
                         'price': current_high_price,
                         'date': current_date,
-                        'index': len(self.current_df) - 1
+                        'index': len(self._dates) - 1
                     }
                 else:
                     # Find first swing high going backwards from current date
-                    swing_highs_by_date = sorted(swing_highs, key=lambda x: x['date'], reverse=True)
-                    first_swing_high = swing_highs_by_date[0]  # Most recent swing high
+                    first_swing_high = max(swing_highs, key=lambda x: x['index'])  # Most recent swing high
                 
                 # Now find first swing low before this swing high
-                swing_lows_before = [sl for sl in swing_lows if sl['date'] < first_swing_high['date']]
+                swing_lows_before = [sl for sl in swing_lows if sl['index'] < first_swing_high['index']]
                 if swing_lows_before:
                     # Get the swing low closest to (but before) the swing high
-                    swing_low = max(swing_lows_before, key=lambda x: x['date'])
+                    swing_low = max(swing_lows_before, key=lambda x: x['index'])
                 else:
                     # Fallback: use any swing low we have
-                    swing_low = max(swing_lows, key=lambda x: x['date'])
+                    swing_low = max(swing_lows, key=lambda x: x['index'])
                 
                 swing_high = first_swing_high
         
@@ -866,49 +1009,29 @@ class ComprehensiveMarketAnalyzer:
             return {"error": "Invalid swing range - swing high must be above swing low"}
         
         # Step 5: Calculate Fibonacci levels - ALWAYS from swing low to swing high, but with different 0% references
-        fib_levels = []
-        fib_ratios = [0.0, 0.236, 0.382, 0.500, 0.618, 0.786, 1.0]
-        extension_ratios = [1.272, 1.414, 1.618, 2.0, 2.618]
-        
-        # Calculate retracement levels - CONSISTENT CALCULATION: Always from swing low to swing high
-        for ratio in fib_ratios:
-            # Both trends: Always calculate from swing low (0%) to swing high (100%)
-            # This ensures consistent Fibonacci structure regardless of trend
-            level_price = swing_low_price + (price_range * ratio)
-            level_type = f"Retracement {ratio*100:.1f}%"
-            
-            distance_pct = abs(level_price - self.current_price) / self.current_price * 100
-            
-            fib_levels.append({
-                'level': level_type,
-                'price': round(level_price, 2),
-                'ratio': ratio,
-                'distance_percent': round(distance_pct, 2),
-                'significance': self._get_fib_significance(ratio)
-            })
-        
-        # Calculate extension levels - CONSISTENT CALCULATION: Always extend beyond swing high
-        for ratio in extension_ratios:
-            # Both trends: Extensions always go beyond swing high (100% level)
-            # This provides upside targets regardless of current trend direction
-            level_price = swing_high_price + (price_range * (ratio - 1))
-            level_type = f"Extension {ratio*100:.1f}%"
-            
-            distance_pct = abs(level_price - self.current_price) / self.current_price * 100
-            
-            fib_levels.append({
-                'level': level_type,
-                'price': round(level_price, 2),
-                'ratio': ratio,
-                'distance_percent': round(distance_pct, 2),
-                'significance': self._get_extension_significance(ratio)
-            })
-        
-        # Sort by distance to current price
-        fib_levels.sort(key=lambda x: x['distance_percent'])
+        # Retracements run from swing low (0%) to swing high (100%); extensions go beyond swing high
+        ratios = self.FIB_RATIOS
+        is_retracement = ratios <= 1.0
+        level_prices = np.where(is_retracement,
+                                swing_low_price + price_range * ratios,
+                                swing_high_price + price_range * (ratios - 1))
+        distance_pcts = np.round(np.abs(level_prices - self.current_price) / self.current_price * 100, 2)
+        level_prices = np.round(level_prices, 2)
+        
+        # Sort by distance to current price (stable, so ties keep ratio order)
+        order = np.argsort(distance_pcts, kind='stable')
+        fib_levels = [{
+            'level': f"{'Retracement' if is_retracement[i] else 'Extension'} {ratio*100:.1f}%",
+            'price': price,
+            'ratio': ratio,
+            'distance_percent': distance,
+            'significance': (self._get_fib_significance(ratio) if is_retracement[i]
+                             else self._get_extension_significance(ratio))
+        } for i, ratio, price, distance in zip(order.tolist(), ratios[order].tolist(),
+                                              level_prices[order].tolist(), distance_pcts[order].tolist())]
         
         # Check if current date was used as a swing point
-        current_date = self.current_df.index[-1]
+        current_date = self._dates[-1]
         used_current_as_swing = (swing_high['date'] == current_date) or (swing_low['date'] == current_date)
         
         if current_trend == "uptrend":
@@ -947,36 +1070,35 @@ class ComprehensiveMarketAnalyzer:
     
     def _get_fib_significance(self, ratio):
         """Get significance for Fibonacci ratios."""
-        significance_map = {
-            0.236: "Shallow retracement - strong trend",
-            0.382: "Moderate retracement - common level",
-            0.500: "Half retracement - psychological level",
-            0.618: "Golden ratio - key reversal level",
-            0.786: "Deep retracement - trend weakness"
-        }
-        return significance_map.get(ratio, "Reference level")
+        return self.FIB_SIGNIFICANCE.get(ratio, "Reference level")
     
     def _get_extension_significance(self, ratio):
         """Get significance for Fibonacci extensions."""
-        significance_map = {
-            1.272: "Common first target",
-            1.414: "Secondary target level",
-            1.618: "Golden ratio target - major level",
-            2.0: "Double extension - psychological target"
-        }
-        return significance_map.get(ratio, "Extension target")
+        return self.EXTENSION_SIGNIFICANCE.get(ratio, "Extension target")
     
-    def generate_comprehensive_analysis(self):
-        """Generate complete comprehensive analysis."""
-        
-        print(f"🎯 Generating COMPREHENSIVE analysis for {self.symbol}...")
-        print(f"   📊 Trendlines, Chart Patterns, Volume & Fibonacci")
-        
-        # Get all analysis components
-        trendline_analysis = self.analyze_trendlines()
-        chart_patterns = self.detect_chart_patterns()
-        volume_analysis = self.analyze_volume()
-        fibonacci_analysis = self.analyze_fibonacci()
+    def generate_comprehensive_analysis(self, include=('trendlines', 'patterns', 'volume', 'fibonacci')):
+        """
+        Generate complete comprehensive analysis.
+        include selects the optional components (see ANALYSIS_COMPONENTS); skipped ones
+        are left out of the result and are never computed.
+        """
+        
+        # Logged rather than printed: analyze_universe and the batch workers run this once per symbol
+        logger.info("Generating comprehensive analysis for %s: %s", self.symbol,
+                    ', '.join(label for name, (_, label) in self.ANALYSIS_COMPONENTS.items() if name in include))
+        
+        # Get requested analysis components; skipped ones feed empty/unavailable inputs to the opportunity scan
+        not_requested = {"error": "Not requested"}
+        trendline_analysis = self.analyze_trendlines() if 'trendlines' in include else {}
+        chart_patterns = self.detect_chart_patterns() if 'patterns' in include else []
+        volume_analysis = self.analyze_volume() if 'volume' in include else not_requested
+        fibonacci_analysis = self.analyze_fibonacci() if 'fibonacci' in include else not_requested
+        components = {
+            'trendlines': trendline_analysis,
+            'patterns': chart_patterns,
+            'volume': volume_analysis,
+            'fibonacci': fibonacci_analysis
+        }
         
         # Market structure
         current_trend = self._determine_current_trend()
@@ -988,36 +1110,35 @@ class ComprehensiveMarketAnalyzer:
                 "analysis_date": self.current_date.strftime("%B %d, %Y"),
                 "analysis_focus": f"Comprehensive analysis - last {self.analysis_window} days",
                 "current_price": round(self.current_price, 2),
-                "analysis_components": ["Trendlines", "Chart Patterns", "Volume Analysis", "Fibonacci Levels"]
+                "analysis_components": [label for name, (_, label) in self.ANALYSIS_COMPONENTS.items()
+                                        if name in include]
             },
             
             "current_market_structure": {
                 "trend": current_trend,
                 "price_action": self._analyze_price_action()
-            },
-            
-            "trendline_analysis": trendline_analysis,
-            "chart_patterns": chart_patterns,
-            "volume_analysis": volume_analysis,
-            "fibonacci_analysis": fibonacci_analysis,
-            
-            "trading_opportunities": self._identify_trading_opportunities(
-                trendline_analysis, chart_patterns, volume_analysis, fibonacci_analysis
-            ),
-            
-            "risk_management": self._generate_risk_management(
-                trendline_analysis, chart_patterns
-            )
+            }
         }
         
+        for name, (key, _) in self.ANALYSIS_COMPONENTS.items():
+            if name in include:
+                comprehensive_analysis[key] = components[name]
+        
+        comprehensive_analysis["trading_opportunities"] = self._identify_trading_opportunities(
+            trendline_analysis, chart_patterns, volume_analysis, fibonacci_analysis
+        )
+        comprehensive_analysis["risk_management"] = self._generate_risk_management(
+            trendline_analysis, chart_patterns
+        )
+        
         return comprehensive_analysis
     
     def _determine_current_trend(self):
         """Determine current market trend."""
         
         # Price vs moving averages
-        sma_10 = self.current_df['close'].rolling(10).mean().iloc[-1] if len(self.current_df) >= 10 else self.current_price
-        sma_20 = self.current_df['close'].rolling(20).mean().iloc[-1] if len(self.current_df) >= 20 else self.current_price
+        sma_10 = self._sma[10] if len(self._close_values) >= 10 else self.current_price
+        sma_20 = self._sma[20] if len(self._close_values) >= 20 else self.current_price
         
         if self.current_price > sma_10 > sma_20:
             trend_direction = "Strong Uptrend"
@@ -1045,15 +1166,18 @@ class ComprehensiveMarketAnalyzer:
     def _analyze_price_action(self):
         """Analyze recent price action."""
         
-        # Recent changes
-        price_1d = (self.current_price - self.current_df['close'].iloc[-2]) if len(self.current_df) > 1 else 0
-        price_5d = (self.current_price - self.current_df['close'].iloc[-6]) if len(self.current_df) > 5 else 0
-        price_20d = (self.current_price - self.current_df['close'].iloc[-21]) if len(self.current_df) > 20 else 0
+        # Recent changes over 1/5/20 days in one subtract (no change when the window is too short)
+        close = self._close_values
+        lags = np.array([1, 5, 20])
+        base = np.where(len(close) > lags, close[-np.minimum(lags + 1, len(close))], self.current_price)
+        changes = self.current_price - base
+        absolute = np.round(changes, 2).tolist()
+        percent = np.round(changes / self.current_price * 100, 2).tolist()
         
         return {
-            "1_day_change": {"absolute": round(price_1d, 2), "percent": round(price_1d/self.current_price*100, 2)},
-            "5_day_change": {"absolute": round(price_5d, 2), "percent": round(price_5d/self.current_price*100, 2)},
-            "20_day_change": {"absolute": round(price_20d, 2), "percent": round(price_20d/self.current_price*100, 2)}
+            "1_day_change": {"absolute": absolute[0], "percent": percent[0]},
+            "5_day_change": {"absolute": absolute[1], "percent": percent[1]},
+            "20_day_change": {"absolute": absolute[2], "percent": percent[2]}
         }
     
     def _identify_trading_opportunities(self, trendlines, patterns, volume, fibonacci):
@@ -1116,21 +1240,18 @@ class ComprehensiveMarketAnalyzer:
         setup = pattern.get('trading_setup', {})
         fib_levels = fibonacci_analysis.get('key_levels', [])
         
-        alignments = []
-        for level in fib_levels[:5]:  # Check top 5 Fib levels
-            fib_price = level['price']
-            
-            # Check various setup prices
-            for setup_key, setup_value in setup.items():
-                if isinstance(setup_value, dict):
-                    for price_key, price_value in setup_value.items():
-                        if isinstance(price_value, (int, float)):
-                            distance_pct = abs(price_value - fib_price) / price_value * 100
-                            if distance_pct < 2:  # Within 2%
-                                alignments.append(f"{level['level']} aligns with {setup_key}")
+        # Check various setup prices (numeric values of the nested setup dicts) against the top 5 Fib levels
+        setup_prices = np.array([price_value for setup_value in setup.values() if isinstance(setup_value, dict)
+                                 for price_value in setup_value.values() if isinstance(price_value, (int, float))],
+                                dtype=np.float64)
+        fib_prices = np.array([level['price'] for level in fib_levels[:5]], dtype=np.float64)
+        
+        # Every level/price pair in one broadcast
+        distance_pct = np.abs(setup_prices[None, :] - fib_prices[:, None]) / setup_prices[None, :] * 100
+        alignments = np.count_nonzero(distance_pct < 2)  # Within 2%
         
         if alignments:
-            return f"Fibonacci support: {len(alignments)} level(s) align"
+            return f"Fibonacci support: {alignments} level(s) align"
         else:
             return "No direct Fibonacci alignment"
     
@@ -1140,16 +1261,18 @@ class ComprehensiveMarketAnalyzer:
         level = trendline['current_value']
         
         if trendline['type'] == 'Resistance':
+            entry, target, stop_loss = np.round(level * np.array([1.005, 1.03, 0.985]), 2).tolist()
             return {
-                'breakout_entry': round(level * 1.005, 2),
-                'target': round(level * 1.03, 2),
-                'stop_loss': round(level * 0.985, 2)
+                'breakout_entry': entry,
+                'target': target,
+                'stop_loss': stop_loss
             }
         else:  # Support
+            entry, target, stop_loss = np.round(level * np.array([1.005, 1.025, 0.98]), 2).tolist()
             return {
-                'bounce_entry': round(level * 1.005, 2),
-                'target': round(level * 1.025, 2),
-                'stop_loss': round(level * 0.98, 2)
+                'bounce_entry': entry,
+                'target': target,
+                'stop_loss': stop_loss
             }
     
     def _generate_risk_management(self, trendlines, patterns):
@@ -1160,23 +1283,28 @@ class ComprehensiveMarketAnalyzer:
         nearest_resistance = None
         
         if 'trendlines' in trendlines:
-            for trendline in trendlines['trendlines']:
-                if trendline['type'] == 'Support' and trendline['current_value'] < self.current_price:
-                    if nearest_support is None or trendline['current_value'] > nearest_support:
-                        nearest_support = trendline['current_value']
-                
-                if trendline['type'] == 'Resistance' and trendline['current_value'] > self.current_price:
-                    if nearest_resistance is None or trendline['current_value'] < nearest_resistance:
-                        nearest_resistance = trendline['current_value']
+            lines = trendlines['trendlines']
+            values = np.fromiter((t['current_value'] for t in lines), dtype=np.float64, count=len(lines))
+            line_types = np.array([t['type'] for t in lines], dtype=object)
+            
+            # Highest support below price and lowest resistance above it
+            supports = values[(line_types == 'Support') & (values < self.current_price)]
+            resistances = values[(line_types == 'Resistance') & (values > self.current_price)]
+            nearest_support = float(supports.max()) if supports.size else None
+            nearest_resistance = float(resistances.min()) if resistances.size else None
+        
+        # 5%, 3% and 1.5% stops
+        conservative_stop, moderate_stop, tight_stop = np.round(
+            self.current_price * np.array([0.95, 0.97, 0.985]), 2).tolist()
         
         return {
             "stop_loss_levels": {
                 "nearest_support": round(nearest_support, 2) if nearest_support else None,
                 "nearest_resistance": round(nearest_resistance, 2) if nearest_resistance else None,
                 "percentage_stops": {
-                    "conservative": round(self.current_price * 0.95, 2),  # 5% stop
-                    "moderate": round(self.current_price * 0.97, 2),     # 3% stop
-                    "tight": round(self.current_price * 0.985, 2)       # 1.5% stop
+                    "conservative": conservative_stop,
+                    "moderate": moderate_stop,
+                    "tight": tight_stop
                 }
             },
             "position_sizing": {
@@ -1187,24 +1315,71 @@ class ComprehensiveMarketAnalyzer:
         }
 
 
-def generate_comprehensive_market_analysis(df, symbol, analysis_window=60):
+def generate_comprehensive_market_analysis(df, symbol, analysis_window=60, timestamp=None,
+                                           include=('trendlines', 'patterns', 'volume', 'fibonacci')):
     """
     Main function to generate comprehensive market analysis.
-    Combines trendlines, patterns, volume, and Fibonacci.
+    Combines trendlines, patterns, volume, and Fibonacci (or the subset in include).
+    timestamp (YYYYmmdd_HHMMSS) names the JSON file; callers saving many symbols
+    can pass one shared value, otherwise the current time is used.
     """
     
     analyzer = ComprehensiveMarketAnalyzer(df, symbol, analysis_window)
-    analysis = analyzer.generate_comprehensive_analysis()
+    analysis = analyzer.generate_comprehensive_analysis(include)
     
     # Save to JSON with timestamp
-    filename = f"{symbol}_comprehensive_analysis_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
-    with open(filename, 'w') as f:
-        json.dump(analysis, f, indent=2, cls=NpEncoder)
+    timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{symbol}_comprehensive_analysis_{timestamp}.json"
+    dump_analysis(filename, analysis)
     
     print(f"✅ Comprehensive analysis saved to: {filename}")
     return analysis
 
 
+def analyze_universe(ohlcv_dict, analysis_window=60, include=('trendlines', 'patterns', 'volume', 'fibonacci')):
+    """
+    Comprehensive analysis for a universe of symbols ({symbol: ohlcv_df}).
+    The flag scan for every symbol runs in one parallel kernel (numba prange);
+    pivot detection and the JSON-facing output stay per symbol.
+    """
+    
+    analyzers = {symbol: ComprehensiveMarketAnalyzer(df, symbol, analysis_window)
+                 for symbol, df in ohlcv_dict.items()}
+    
+    # Pack flag-scan inputs into left-aligned 2-D arrays, one row per symbol
+    scannable = ([analyzer for analyzer in analyzers.values() if len(analyzer._close_values) >= 30]
+                 if 'patterns' in include else [])
+    if scannable:
+        inputs = [analyzer._flag_scan_inputs() for analyzer in scannable]
+        lengths = np.array([len(close) for close, _, _ in inputs], dtype=np.int64)
+        packed = np.full((3, len(inputs), lengths.max()), np.nan)
+        for row, arrays in enumerate(inputs):
+            for k, values in enumerate(arrays):
+                packed[k, row, :len(values)] = values
+        
+        counts, *results = scan_flags_batch(packed[0], packed[1], packed[2], lengths)
+        for row, analyzer in enumerate(scannable):
+            analyzer._flag_candidates = tuple(result[row, :counts[row]] for result in results)
+    
+    return {symbol: analyzer.generate_comprehensive_analysis(include) for symbol, analyzer in analyzers.items()}
+
+
+def _analyze_chunk(items, analysis_window, include):
+    """Worker for generate_comprehensive_market_analysis_batch: one chunk of (symbol, df) pairs."""
+    return analyze_universe(dict(items), analysis_window, include)
+
+
+def generate_comprehensive_market_analysis_batch(dfs, analysis_window=60, n_jobs=-1,
+                                                 include=('trendlines', 'patterns', 'volume', 'fibonacci')):
+    """
+    Comprehensive analysis for many symbols ({symbol: ohlcv_df}) across worker processes,
+    each chunk running through analyze_universe. Returns {symbol: analysis} without
+    writing JSON files.
+    """
+    
+    return run_in_chunks(dfs.items(), _analyze_chunk, n_jobs, analysis_window, include)
+
+
 if __name__ == "__main__":
     print("🎯 COMPREHENSIVE MARKET ANALYZER")
     print("=" * 80)
@@ -1,16 +1,103 @@
 import numpy as np
 import pandas as pd
-import json
+import math
+import contextlib
+import functools
+import itertools
+import hashlib
+import os
+import pickle
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional, Union
 from datetime import datetime, timedelta
-from detector import NpEncoder
+from jit_kernels import last_moving_averages, half_means, detect_swings, count_near
+from analysis_utils import dump_analysis, run_in_chunks
 import logging
 
+logger = logging.getLogger(__name__)
+
+# Lifetime of the opt-in on-disk memo of finished analyses, see generate_current_market_analysis
+ANALYSIS_CACHE_TTL = 15 * 60  # Seconds
+
+
+def _cached_result(method):
+    """Compute an analysis component once per analyzer and reuse it (stored in self.results)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if method.__name__ not in self.results:
+            self.results[method.__name__] = method(self, *args, **kwargs)
+        return self.results[method.__name__]
+    return wrapper
+
+
+@dataclass(slots=True)
+class LevelRecord:
+    """JSON-facing support/resistance level; converted with asdict() in identify_current_support_resistance."""
+    price: float
+    strength: str
+    established_date: str
+    days_ago: int
+    distance_percent: float
+    type: str
+    description: str
+
+
+@dataclass(slots=True)
+class ScenarioRecord:
+    """JSON-facing forecast scenario; converted with asdict() in _generate_forecast_scenarios."""
+    scenario_name: str
+    probability: str
+    target_price: Union[float, str]
+    timeline: str
+    trigger_conditions: str
+    invalidation_level: Union[float, str]
+    description: str
+
+
+@dataclass(slots=True)
+class PatternActionRecord:
+    """JSON-facing pattern setup action; converted with asdict() in _generate_immediate_trading_plan."""
+    action_type: str
+    priority: str
+    specific_action: str
+    trigger_price: Optional[float]
+    timeline: str
+    pattern_type: Optional[str]
+
+
+@dataclass(slots=True)
+class LevelActionRecord:
+    """JSON-facing level watch action; converted with asdict() in _generate_immediate_trading_plan."""
+    action_type: str
+    priority: str
+    specific_action: str
+    trigger_price: float
+    timeline: str
+    level_type: str
+
+
 class CurrentMarketAnalyzer:
     """
     Focuses on CURRENT market structure and ACTIVE patterns only.
     Analyzes what's happening RIGHT NOW and where price is likely to go next.
     """
     
+    # Trend bias -> direction sign, and (trend sign, pattern sign) -> position stance
+    BIAS_SIGN = {"Bullish": 1, "Cautiously Bullish": 1, "Bearish": -1, "Cautiously Bearish": -1}
+    STANCES = {
+        (1, 1): "Long Bias - Look for buying opportunities",
+        (-1, -1): "Short Bias - Look for selling opportunities"
+    }
+    
+    # Fixed attribute set: no per-instance __dict__ when many symbols are analyzed
+    __slots__ = (
+        'symbol', 'analysis_window', 'df', 'current_df',
+        '_high_values', '_low_values', '_close_values', '_dates', '_days_ago',
+        'current_price', 'current_date', '_date_str', 'current_high', 'current_low', 'current_range',
+        'price_change_1d', 'price_change_5d', 'price_change_20d', 'results', '_sma_20'
+    )
+    
     def __init__(self, df, symbol="UNKNOWN", analysis_window=60):
         """
         Initialize with focus on recent price action only.
@@ -27,33 +114,47 @@ class CurrentMarketAnalyzer:
         self.df = df.tail(analysis_window * 2)  # Extra buffer for calculations
         self.current_df = df.tail(analysis_window)  # Main analysis window
         
-        self.current_price = df['close'].iloc[-1]
+        # NumPy arrays of the analysis window, sliced by the analysis methods. Prices stay
+        # float64: levels are reported to 2 decimals and compared against 2% tolerances.
+        # Volume is not used by the current-structure analysis, so it is not converted.
+        # Contiguous, so the JIT kernels always get the same array layout (no recompiles).
+        self._high_values = np.ascontiguousarray(self.current_df['high'].to_numpy(dtype=np.float64))
+        self._low_values = np.ascontiguousarray(self.current_df['low'].to_numpy(dtype=np.float64))
+        self._close_values = np.ascontiguousarray(self.current_df['close'].to_numpy(dtype=np.float64))
+        self._dates = self.current_df.index
+        
+        # Whole days from each bar to the latest one, via datetime64 arithmetic
+        date_values = self._dates.values
+        self._days_ago = (date_values[-1] - date_values).astype('timedelta64[D]').astype(np.int64)
+        
+        closes = df['close'].to_numpy()
+        self.current_price = closes[-1]
         self.current_date = df.index[-1]
+        self._date_str = self.current_date.strftime("%B %d, %Y")  # Reported analysis date
         
         # Key price levels from recent action
-        self.current_high = self.current_df['high'].max()
-        self.current_low = self.current_df['low'].min()
+        self.current_high = np.nanmax(self._high_values)
+        self.current_low = np.nanmin(self._low_values)
         self.current_range = self.current_high - self.current_low
         
-        # Recent performance
-        self.price_change_1d = df['close'].iloc[-1] - df['close'].iloc[-2] if len(df) > 1 else 0
-        self.price_change_5d = df['close'].iloc[-1] - df['close'].iloc[-6] if len(df) > 5 else 0
-        self.price_change_20d = df['close'].iloc[-1] - df['close'].iloc[-21] if len(df) > 20 else 0
+        # Recent performance over 1/5/20 days (0 when history is too short)
+        self.price_change_1d, self.price_change_5d, self.price_change_20d = (
+            closes[-1] - closes[-days - 1] if len(closes) > days else 0 for days in (1, 5, 20)
+        )
         
+        # Results of the analysis components, filled on first call (see _cached_result)
         self.results = {}
     
+    @_cached_result
     def analyze_current_trend(self):
         """Analyze the current trend structure - what's happening RIGHT NOW."""
         
-        recent_data = self.current_df.copy()
-        
-        # Moving averages for trend context
-        recent_data['sma_10'] = recent_data['close'].rolling(10).mean()
-        recent_data['sma_20'] = recent_data['close'].rolling(20).mean()
-        recent_data['ema_10'] = recent_data['close'].ewm(span=10).mean()
+        # Moving averages for trend context (last values only, one compiled pass)
+        sma_10, sma_20 = last_moving_averages(self._close_values, 10, 20)
+        self._sma_20 = sma_20  # Unrounded, reused by the trend continuation setup
         
-        current_sma10 = recent_data['sma_10'].iloc[-1] if not pd.isna(recent_data['sma_10'].iloc[-1]) else self.current_price
-        current_sma20 = recent_data['sma_20'].iloc[-1] if not pd.isna(recent_data['sma_20'].iloc[-1]) else self.current_price
+        current_sma10 = sma_10 if not math.isnan(sma_10) else self.current_price
+        current_sma20 = sma_20 if not math.isnan(sma_20) else self.current_price
         
         # Trend determination
         if self.current_price > current_sma10 > current_sma20:
@@ -83,8 +184,11 @@ class CurrentMarketAnalyzer:
         momentum_20d = "Positive" if self.price_change_20d > 0 else "Negative"
         
         # Current volatility
-        recent_returns = recent_data['close'].pct_change().dropna()
-        current_volatility = recent_returns.std() * np.sqrt(252) * 100  # Annualized volatility %
+        close = self._close_values
+        recent_returns = (close[1:] - close[:-1]) / close[:-1]
+        recent_returns = recent_returns[np.isfinite(recent_returns)]  # Missing closes drop out, as with dropna()
+        returns_std = recent_returns.std(ddof=1) if len(recent_returns) > 1 else np.nan
+        current_volatility = returns_std * np.sqrt(252) * 100  # Annualized volatility %
         
         return {
             "current_trend": {
@@ -106,148 +210,127 @@ class CurrentMarketAnalyzer:
             }
         }
     
+    @_cached_result
     def identify_current_support_resistance(self):
         """Identify CURRENT support and resistance levels based on recent price action."""
         
-        recent_data = self.current_df.copy()
-        
-        # Find recent significant highs and lows
-        def find_recent_pivots(data, window=5):
-            highs = []
-            lows = []
-            
-            for i in range(window, len(data) - window):
-                # Check if it's a local high
-                if all(data['high'].iloc[i] >= data['high'].iloc[i-j] for j in range(1, window+1)) and \
-                   all(data['high'].iloc[i] >= data['high'].iloc[i+j] for j in range(1, window+1)):
-                    highs.append({
-                        'date': data.index[i],
-                        'price': data['high'].iloc[i],
-                        'days_ago': (self.current_date - data.index[i]).days,
-                        'volume': data['volume'].iloc[i] if 'volume' in data.columns else 0
-                    })
-                
-                # Check if it's a local low
-                if all(data['low'].iloc[i] <= data['low'].iloc[i-j] for j in range(1, window+1)) and \
-                   all(data['low'].iloc[i] <= data['low'].iloc[i+j] for j in range(1, window+1)):
-                    lows.append({
-                        'date': data.index[i],
-                        'price': data['low'].iloc[i],
-                        'days_ago': (self.current_date - data.index[i]).days,
-                        'volume': data['volume'].iloc[i] if 'volume' in data.columns else 0
-                    })
-            
-            return highs, lows
-        
-        recent_highs, recent_lows = find_recent_pivots(recent_data)
+        # Find recent significant highs and lows as bar positions in the window
+        # (at least as high/low as the 5 bars on each side)
+        high_indices, low_indices = detect_swings(self._high_values, self._low_values, 5)
+        high_prices = self._high_values[high_indices]
+        low_prices = self._low_values[low_indices]
         
         # Filter for significant levels (within reasonable distance from current price)
         price_tolerance = self.current_price * 0.15  # 15% from current price
         
-        relevant_resistance = [h for h in recent_highs if 
-                             h['price'] > self.current_price and 
-                             h['price'] <= self.current_price + price_tolerance]
-        
-        relevant_support = [l for l in recent_lows if 
-                          l['price'] < self.current_price and 
-                          l['price'] >= self.current_price - price_tolerance]
+        resistance_mask = (high_prices > self.current_price) & (high_prices <= self.current_price + price_tolerance)
+        support_mask = (low_prices < self.current_price) & (low_prices >= self.current_price - price_tolerance)
         
-        # Sort by proximity to current price
-        relevant_resistance.sort(key=lambda x: abs(x['price'] - self.current_price))
-        relevant_support.sort(key=lambda x: abs(x['price'] - self.current_price))
+        # Sort by proximity to current price (stable, so ties keep chronological order)
+        resistance_order = np.argsort(np.abs(high_prices[resistance_mask] - self.current_price), kind='stable')
+        support_order = np.argsort(np.abs(low_prices[support_mask] - self.current_price), kind='stable')
+        relevant_resistance = high_indices[resistance_mask][resistance_order]
+        relevant_support = low_indices[support_mask][support_order]
         
         # Add psychological levels (round numbers)
         def get_psychological_levels():
             # Find nearest round numbers
-            levels = []
             current = self.current_price
             
-            # Major round numbers (100s, 50s)
-            for multiplier in [50, 100, 250, 500]:
-                lower_level = (int(current / multiplier) * multiplier)
-                upper_level = lower_level + multiplier
-                
-                if abs(lower_level - current) < current * 0.1 and lower_level != current:
-                    levels.append(lower_level)
-                if abs(upper_level - current) < current * 0.1 and upper_level != current:
-                    levels.append(upper_level)
+            # Major round numbers (100s, 50s): the multiples just below and above price
+            multipliers = np.array([50, 100, 250, 500])
+            lower_levels = np.trunc(current / multipliers).astype(np.int64) * multipliers
+            levels = np.concatenate([lower_levels, lower_levels + multipliers])
             
-            return sorted(set(levels))
+            keep = (np.abs(levels - current) < current * 0.1) & (levels != current)
+            return np.unique(levels[keep]).tolist()  # Sorted, de-duplicated Python ints
         
         psychological_levels = get_psychological_levels()
         
         # Format resistance levels
         resistance_levels = []
-        for i, res in enumerate(relevant_resistance[:3]):  # Top 3
-            distance_pct = (res['price'] - self.current_price) / self.current_price * 100
-            strength = "Strong" if res['days_ago'] < 20 else "Medium"
+        for i in relevant_resistance[:3]:  # Top 3
+            price = self._high_values[i]
+            level_days_ago = int(self._days_ago[i])
+            distance_pct = (price - self.current_price) / self.current_price * 100
+            strength = "Strong" if level_days_ago < 20 else "Medium"
             
-            resistance_levels.append({
-                "price": round(res['price'], 2),
-                "strength": strength,
-                "established_date": res['date'].strftime("%B %d, %Y"),
-                "days_ago": res['days_ago'],
-                "distance_percent": round(distance_pct, 1),
-                "type": "Technical Resistance",
-                "description": f"Recent high formed {res['days_ago']} days ago - {distance_pct:.1f}% above current price"
-            })
+            resistance_levels.append(LevelRecord(
+                price=round(price, 2),
+                strength=strength,
+                established_date=self._dates[i].strftime("%B %d, %Y"),
+                days_ago=level_days_ago,
+                distance_percent=round(distance_pct, 1),
+                type="Technical Resistance",
+                description=f"Recent high formed {level_days_ago} days ago - {distance_pct:.1f}% above current price"
+            ))
         
         # Format support levels
         support_levels = []
-        for i, sup in enumerate(relevant_support[:3]):  # Top 3
-            distance_pct = (self.current_price - sup['price']) / self.current_price * 100
-            strength = "Strong" if sup['days_ago'] < 20 else "Medium"
+        for i in relevant_support[:3]:  # Top 3
+            price = self._low_values[i]
+            level_days_ago = int(self._days_ago[i])
+            distance_pct = (self.current_price - price) / self.current_price * 100
+            strength = "Strong" if level_days_ago < 20 else "Medium"
             
-            support_levels.append({
-                "price": round(sup['price'], 2),
-                "strength": strength,
-                "established_date": sup['date'].strftime("%B %d, %Y"),
-                "days_ago": sup['days_ago'],
-                "distance_percent": round(distance_pct, 1),
-                "type": "Technical Support",
-                "description": f"Recent low formed {sup['days_ago']} days ago - {distance_pct:.1f}% below current price"
-            })
+            support_levels.append(LevelRecord(
+                price=round(price, 2),
+                strength=strength,
+                established_date=self._dates[i].strftime("%B %d, %Y"),
+                days_ago=level_days_ago,
+                distance_percent=round(distance_pct, 1),
+                type="Technical Support",
+                description=f"Recent low formed {level_days_ago} days ago - {distance_pct:.1f}% below current price"
+            ))
         
         # Add psychological levels
         for level in psychological_levels:
             if level > self.current_price:
                 distance_pct = (level - self.current_price) / self.current_price * 100
                 if distance_pct < 10:  # Only if within 10%
-                    resistance_levels.append({
-                        "price": level,
-                        "strength": "Medium",
-                        "established_date": "Ongoing",
-                        "days_ago": 0,
-                        "distance_percent": round(distance_pct, 1),
-                        "type": "Psychological Resistance",
-                        "description": f"Round number resistance at {level} - {distance_pct:.1f}% above current price"
-                    })
+                    resistance_levels.append(LevelRecord(
+                        price=level,
+                        strength="Medium",
+                        established_date="Ongoing",
+                        days_ago=0,
+                        distance_percent=round(distance_pct, 1),
+                        type="Psychological Resistance",
+                        description=f"Round number resistance at {level} - {distance_pct:.1f}% above current price"
+                    ))
             elif level < self.current_price:
                 distance_pct = (self.current_price - level) / self.current_price * 100
                 if distance_pct < 10:  # Only if within 10%
-                    support_levels.append({
-                        "price": level,
-                        "strength": "Medium", 
-                        "established_date": "Ongoing",
-                        "days_ago": 0,
-                        "distance_percent": round(distance_pct, 1),
-                        "type": "Psychological Support",
-                        "description": f"Round number support at {level} - {distance_pct:.1f}% below current price"
-                    })
-        
-        # Sort by proximity and limit to top 3 each
-        resistance_levels = sorted(resistance_levels, key=lambda x: x['distance_percent'])[:3]
-        support_levels = sorted(support_levels, key=lambda x: x['distance_percent'])[:3]
+                    support_levels.append(LevelRecord(
+                        price=level,
+                        strength="Medium",
+                        established_date="Ongoing",
+                        days_ago=0,
+                        distance_percent=round(distance_pct, 1),
+                        type="Psychological Support",
+                        description=f"Round number support at {level} - {distance_pct:.1f}% below current price"
+                    ))
+        
+        # Sort by proximity (stable argsort, so ties keep technical levels first) and limit to top 3 each
+        resistance_order = np.argsort(np.fromiter((level.distance_percent for level in resistance_levels),
+                                                  dtype=np.float64, count=len(resistance_levels)), kind='stable')
+        support_order = np.argsort(np.fromiter((level.distance_percent for level in support_levels),
+                                               dtype=np.float64, count=len(support_levels)), kind='stable')
+        resistance_levels = [resistance_levels[i] for i in resistance_order[:3]]
+        support_levels = [support_levels[i] for i in support_order[:3]]
         
         return {
-            "current_support_levels": support_levels,
-            "current_resistance_levels": resistance_levels
+            "current_support_levels": [asdict(level) for level in support_levels],
+            "current_resistance_levels": [asdict(level) for level in resistance_levels]
         }
     
+    @_cached_result
     def detect_active_patterns(self):
         """Detect patterns that are CURRENTLY forming or about to complete."""
         
-        recent_data = self.current_df.copy()
+        # The trend analysis is cached, so this does not recompute it
+        trend_direction = self.analyze_current_trend()['current_trend']['direction']
+        
+        recent_data = self.current_df  # Read-only, so no copy needed
         active_patterns = []
         
         # 1. Current Consolidation Patterns
@@ -261,7 +344,7 @@ class CurrentMarketAnalyzer:
             active_patterns.append(breakout_pattern)
         
         # 3. Current Trend Continuation Setup
-        trend_continuation = self._detect_trend_continuation(recent_data)
+        trend_continuation = self._detect_trend_continuation(recent_data, trend_direction)
         if trend_continuation:
             active_patterns.append(trend_continuation)
         
@@ -272,23 +355,24 @@ class CurrentMarketAnalyzer:
         
         # Look at last 20 days for consolidation
         consolidation_period = min(20, len(data))
-        recent_period = data.tail(consolidation_period)
         
-        if len(recent_period) < 10:
+        if consolidation_period < 10:
             return None
         
-        period_high = recent_period['high'].max()
-        period_low = recent_period['low'].min()
+        period_high = np.nanmax(self._high_values[-consolidation_period:])
+        period_low = np.nanmin(self._low_values[-consolidation_period:])
         period_range = period_high - period_low
         range_pct = period_range / self.current_price * 100
         
         # Check if we're in a tight range
         if range_pct < 8:  # Less than 8% range indicates consolidation
             
-            # Determine consolidation type
-            first_half_avg = recent_period.head(consolidation_period//2)['close'].mean()
-            second_half_avg = recent_period.tail(consolidation_period//2)['close'].mean()
+            # Half means only matter once the range gate passes
+            first_half_avg, second_half_avg = half_means(
+                self._close_values[-consolidation_period:], consolidation_period // 2
+            )
             
+            # Determine consolidation type
             if second_half_avg > first_half_avg * 1.02:
                 consolidation_type = "Bullish Consolidation"
                 bias = "Bullish"
@@ -309,6 +393,12 @@ class CurrentMarketAnalyzer:
             target_up = breakout_level_up + period_range  # Range projection upward
             target_down = breakout_level_down - period_range  # Range projection downward
             
+            # Round the scenario prices once in bulk
+            trigger_up, rounded_target_up, stop_up, trigger_down, rounded_target_down, stop_down = np.round([
+                breakout_level_up, target_up, period_low * 0.995,
+                breakout_level_down, target_down, period_high * 1.005
+            ], 2).tolist()
+            
             return {
                 "pattern_id": f"CONSOLIDATION_CURRENT",
                 "pattern_name": consolidation_type,
@@ -326,15 +416,15 @@ class CurrentMarketAnalyzer:
                 
                 "trading_setup": {
                     "bullish_scenario": {
-                        "trigger_price": round(breakout_level_up, 2),
-                        "target_price": round(target_up, 2),
-                        "stop_loss": round(period_low * 0.995, 2),
+                        "trigger_price": trigger_up,
+                        "target_price": rounded_target_up,
+                        "stop_loss": stop_up,
                         "risk_reward_ratio": f"1:{((target_up - breakout_level_up) / (breakout_level_up - period_low * 0.995)):.2f}"
                     },
                     "bearish_scenario": {
-                        "trigger_price": round(breakout_level_down, 2),
-                        "target_price": round(target_down, 2),
-                        "stop_loss": round(period_high * 1.005, 2),
+                        "trigger_price": trigger_down,
+                        "target_price": rounded_target_down,
+                        "stop_loss": stop_down,
                         "risk_reward_ratio": f"1:{((breakout_level_down - target_down) / (period_high * 1.005 - breakout_level_down)):.2f}"
                     }
                 },
@@ -349,13 +439,12 @@ class CurrentMarketAnalyzer:
         """Detect if we're at a key breakout level RIGHT NOW."""
         
         # Look for resistance/support test in progress
-        recent_3_days = data.tail(3)
-        if len(recent_3_days) < 3:
+        if len(data) < 3:
             return None
         
-        # Check if we're near recent high or low
-        recent_30_high = data.tail(30)['high'].max()
-        recent_30_low = data.tail(30)['low'].min()
+        # Check if we're near recent high or low (slices clip to shorter windows)
+        recent_30_high = np.nanmax(self._high_values[-30:])
+        recent_30_low = np.nanmin(self._low_values[-30:])
         
         current_price = self.current_price
         
@@ -364,6 +453,14 @@ class CurrentMarketAnalyzer:
         near_support = abs(current_price - recent_30_low) / current_price < 0.02  # Within 2%
         
         if near_resistance:
+            level, price, entry, target, stop = np.round([
+                recent_30_high,
+                current_price,
+                recent_30_high * 1.002,  # 0.2% above resistance
+                recent_30_high + (recent_30_high - recent_30_low) * 0.618,  # 61.8% of range
+                recent_30_high * 0.98  # 2% below resistance
+            ], 2).tolist()
+            
             return {
                 "pattern_id": f"BREAKOUT_RESISTANCE_CURRENT",
                 "pattern_name": "Resistance Breakout Setup",
@@ -373,18 +470,18 @@ class CurrentMarketAnalyzer:
                 "reliability_score": "High (75%)",
                 
                 "current_structure": {
-                    "resistance_level": round(recent_30_high, 2),
-                    "current_price": round(current_price, 2),
+                    "resistance_level": level,
+                    "current_price": price,
                     "distance_to_breakout": f"{((recent_30_high - current_price) / current_price * 100):.1f}%",
-                    "attempts_at_level": self._count_resistance_tests(data, recent_30_high)
+                    "attempts_at_level": self._count_resistance_tests(self._high_values, recent_30_high)
                 },
                 
                 "trading_setup": {
                     "entry_strategy": {
-                        "trigger_price": round(recent_30_high * 1.002, 2),  # 0.2% above resistance
+                        "trigger_price": entry,
                         "confirmation_needed": "Close above resistance on above-average volume",
-                        "target_price": round(recent_30_high + (recent_30_high - recent_30_low) * 0.618, 2),  # 61.8% of range
-                        "stop_loss": round(recent_30_high * 0.98, 2),  # 2% below resistance
+                        "target_price": target,
+                        "stop_loss": stop,
                         "position_sizing": "Risk 1-2% of portfolio"
                     }
                 },
@@ -394,6 +491,14 @@ class CurrentMarketAnalyzer:
             }
         
         elif near_support:
+            level, price, entry, target, stop = np.round([
+                recent_30_low,
+                current_price,
+                recent_30_low * 0.998,  # 0.2% below support
+                recent_30_low - (recent_30_high - recent_30_low) * 0.618,  # 61.8% of range
+                recent_30_low * 1.02  # 2% above support
+            ], 2).tolist()
+            
             return {
                 "pattern_id": f"BREAKDOWN_SUPPORT_CURRENT", 
                 "pattern_name": "Support Breakdown Setup",
@@ -403,18 +508,18 @@ class CurrentMarketAnalyzer:
                 "reliability_score": "High (75%)",
                 
                 "current_structure": {
-                    "support_level": round(recent_30_low, 2),
-                    "current_price": round(current_price, 2),
+                    "support_level": level,
+                    "current_price": price,
                     "distance_to_breakdown": f"{((current_price - recent_30_low) / current_price * 100):.1f}%",
-                    "attempts_at_level": self._count_support_tests(data, recent_30_low)
+                    "attempts_at_level": self._count_support_tests(self._low_values, recent_30_low)
                 },
                 
                 "trading_setup": {
                     "entry_strategy": {
-                        "trigger_price": round(recent_30_low * 0.998, 2),  # 0.2% below support
+                        "trigger_price": entry,
                         "confirmation_needed": "Close below support on above-average volume",
-                        "target_price": round(recent_30_low - (recent_30_high - recent_30_low) * 0.618, 2),  # 61.8% of range
-                        "stop_loss": round(recent_30_low * 1.02, 2),  # 2% above support  
+                        "target_price": target,
+                        "stop_loss": stop,
                         "position_sizing": "Risk 1-2% of portfolio"
                     }
                 },
@@ -425,27 +530,30 @@ class CurrentMarketAnalyzer:
         
         return None
     
-    def _detect_trend_continuation(self, data):
-        """Detect trend continuation setups based on current trend."""
-        
-        # Analyze trend from trend analysis
-        trend_analysis = self.analyze_current_trend()
-        current_trend = trend_analysis['current_trend']['direction']
+    def _detect_trend_continuation(self, data, current_trend):
+        """Detect trend continuation setups based on current trend direction."""
         
         if "Uptrend" in current_trend:
             # Look for pullback buying opportunity
-            recent_10_days = data.tail(10)
-            if len(recent_10_days) < 10:
+            if len(data) < 10:
                 return None
                 
-            pullback_low = recent_10_days['low'].min()
-            trend_high = data.tail(30)['high'].max()
+            pullback_low = np.nanmin(self._low_values[-10:])
+            trend_high = np.nanmax(self._high_values[-30:])
             
             # Check if we've pulled back enough but not too much
             pullback_pct = (trend_high - pullback_low) / trend_high * 100
             
             if 3 < pullback_pct < 15:  # 3-15% pullback is healthy
-                sma_20 = data['close'].rolling(20).mean().iloc[-1] if len(data) >= 20 else self.current_price
+                sma_20 = self._trend_sma_20() if len(data) >= 20 else self.current_price
+                low, high, sma, entry, target, stop = np.round([
+                    pullback_low,
+                    trend_high,
+                    sma_20,
+                    max(sma_20, pullback_low * 1.01),
+                    trend_high * 1.05,  # 5% above previous high
+                    pullback_low * 0.97  # 3% below pullback low
+                ], 2).tolist()
                 
                 return {
                     "pattern_id": f"TREND_CONTINUATION_BULLISH_CURRENT",
@@ -458,17 +566,17 @@ class CurrentMarketAnalyzer:
                     "current_structure": {
                         "trend_direction": "Uptrend",
                         "pullback_percentage": f"{pullback_pct:.1f}%",
-                        "pullback_low": round(pullback_low, 2),
-                        "trend_high": round(trend_high, 2),
-                        "sma_20_support": round(sma_20, 2) if not pd.isna(sma_20) else "N/A"
+                        "pullback_low": low,
+                        "trend_high": high,
+                        "sma_20_support": sma if not math.isnan(sma_20) else "N/A"
                     },
                     
                     "trading_setup": {
                         "entry_strategy": {
-                            "trigger_price": round(max(sma_20, pullback_low * 1.01), 2),
+                            "trigger_price": entry,
                             "confirmation_needed": "Bounce from support with volume increase",
-                            "target_price": round(trend_high * 1.05, 2),  # 5% above previous high
-                            "stop_loss": round(pullback_low * 0.97, 2),  # 3% below pullback low
+                            "target_price": target,
+                            "stop_loss": stop,
                             "position_sizing": "Risk 1.5-2.5% of portfolio"
                         }
                     },
@@ -479,18 +587,25 @@ class CurrentMarketAnalyzer:
         
         elif "Downtrend" in current_trend:
             # Look for rally selling opportunity
-            recent_10_days = data.tail(10)
-            if len(recent_10_days) < 10:
+            if len(data) < 10:
                 return None
                 
-            rally_high = recent_10_days['high'].max()
-            trend_low = data.tail(30)['low'].min()
+            rally_high = np.nanmax(self._high_values[-10:])
+            trend_low = np.nanmin(self._low_values[-30:])
             
             # Check if we've rallied enough but not too much
             rally_pct = (rally_high - trend_low) / trend_low * 100
             
             if 3 < rally_pct < 15:  # 3-15% rally in downtrend
-                sma_20 = data['close'].rolling(20).mean().iloc[-1] if len(data) >= 20 else self.current_price
+                sma_20 = self._trend_sma_20() if len(data) >= 20 else self.current_price
+                high, low, sma, entry, target, stop = np.round([
+                    rally_high,
+                    trend_low,
+                    sma_20,
+                    min(sma_20, rally_high * 0.99),
+                    trend_low * 0.95,  # 5% below previous low
+                    rally_high * 1.03  # 3% above rally high
+                ], 2).tolist()
                 
                 return {
                     "pattern_id": f"TREND_CONTINUATION_BEARISH_CURRENT",
@@ -503,17 +618,17 @@ class CurrentMarketAnalyzer:
                     "current_structure": {
                         "trend_direction": "Downtrend",
                         "rally_percentage": f"{rally_pct:.1f}%",
-                        "rally_high": round(rally_high, 2),
-                        "trend_low": round(trend_low, 2),
-                        "sma_20_resistance": round(sma_20, 2) if not pd.isna(sma_20) else "N/A"
+                        "rally_high": high,
+                        "trend_low": low,
+                        "sma_20_resistance": sma if not math.isnan(sma_20) else "N/A"
                     },
                     
                     "trading_setup": {
                         "entry_strategy": {
-                            "trigger_price": round(min(sma_20, rally_high * 0.99), 2),
+                            "trigger_price": entry,
                             "confirmation_needed": "Rejection from resistance with volume increase", 
-                            "target_price": round(trend_low * 0.95, 2),  # 5% below previous low
-                            "stop_loss": round(rally_high * 1.03, 2),  # 3% above rally high
+                            "target_price": target,
+                            "stop_loss": stop,
                             "position_sizing": "Risk 1.5-2.5% of portfolio"
                         }
                     },
@@ -524,28 +639,22 @@ class CurrentMarketAnalyzer:
         
         return None
     
-    def _count_resistance_tests(self, data, resistance_level, tolerance=0.02):
-        """Count how many times resistance has been tested recently."""
-        count = 0
+    def _trend_sma_20(self):
+        """Unrounded 20-day SMA from the (cached) trend analysis."""
+        self.analyze_current_trend()
+        return self._sma_20
+    
+    def _count_resistance_tests(self, highs, resistance_level, tolerance=0.02):
+        """Count how many times resistance has been tested recently (highs within tolerance)."""
         tolerance_range = resistance_level * tolerance
-        
-        for i in range(len(data)):
-            if abs(data['high'].iloc[i] - resistance_level) <= tolerance_range:
-                count += 1
-        
-        return count
+        return int(count_near(highs, resistance_level, tolerance_range))
     
-    def _count_support_tests(self, data, support_level, tolerance=0.02):
-        """Count how many times support has been tested recently.""" 
-        count = 0
+    def _count_support_tests(self, lows, support_level, tolerance=0.02):
+        """Count how many times support has been tested recently (lows within tolerance)."""
         tolerance_range = support_level * tolerance
-        
-        for i in range(len(data)):
-            if abs(data['low'].iloc[i] - support_level) <= tolerance_range:
-                count += 1
-                
-        return count
+        return int(count_near(lows, support_level, tolerance_range))
     
+    @_cached_result
     def generate_current_market_forecast(self):
         """Generate forward-looking forecast based on current analysis."""
         
@@ -565,7 +674,7 @@ class CurrentMarketAnalyzer:
         
         return {
             "forecast_summary": {
-                "analysis_date": self.current_date.strftime("%B %d, %Y"),
+                "analysis_date": self._date_str,
                 "current_price": self.current_price,
                 "primary_bias": trend_bias,
                 "momentum_alignment": momentum_alignment,
@@ -605,55 +714,59 @@ class CurrentMarketAnalyzer:
         resistance_levels = levels_analysis['current_resistance_levels']
         support_levels = levels_analysis['current_support_levels']
         
+        # Nearest levels, falling back to 5% either side of price
+        nearest_resistance = resistance_levels[0]['price'] if resistance_levels else self.current_price * 1.05
+        nearest_support = support_levels[0]['price'] if support_levels else self.current_price * 0.95
+        resistance_text = f"{nearest_resistance:.2f}"  # Formatted once, shared by the scenario texts
+        support_text = f"{nearest_support:.2f}"
+        
         # Primary scenario based on trend and patterns
         trend_direction = trend_analysis['current_trend']['direction']
         
         if "Uptrend" in trend_direction and resistance_levels:
-            next_resistance = resistance_levels[0]['price']
             probability = 65 if trend_analysis['current_trend']['strength'] == "Strong" else 45
             
-            scenarios.append({
-                "scenario_name": "Bullish Continuation",
-                "probability": f"{probability}%",
-                "target_price": next_resistance,
-                "timeline": "5-15 days",
-                "trigger_conditions": f"Hold above {support_levels[0]['price'] if support_levels else self.current_price * 0.95:.2f}",
-                "invalidation_level": support_levels[0]['price'] if support_levels else self.current_price * 0.95,
-                "description": f"Uptrend continues toward {next_resistance:.2f} resistance"
-            })
+            scenarios.append(ScenarioRecord(
+                scenario_name="Bullish Continuation",
+                probability=f"{probability}%",
+                target_price=nearest_resistance,
+                timeline="5-15 days",
+                trigger_conditions=f"Hold above {support_text}",
+                invalidation_level=nearest_support,
+                description=f"Uptrend continues toward {resistance_text} resistance"
+            ))
         
         elif "Downtrend" in trend_direction and support_levels:
-            next_support = support_levels[0]['price']
             probability = 65 if trend_analysis['current_trend']['strength'] == "Strong" else 45
             
-            scenarios.append({
-                "scenario_name": "Bearish Continuation", 
-                "probability": f"{probability}%",
-                "target_price": next_support,
-                "timeline": "5-15 days",
-                "trigger_conditions": f"Break below {resistance_levels[0]['price'] if resistance_levels else self.current_price * 1.05:.2f}",
-                "invalidation_level": resistance_levels[0]['price'] if resistance_levels else self.current_price * 1.05,
-                "description": f"Downtrend continues toward {next_support:.2f} support"
-            })
+            scenarios.append(ScenarioRecord(
+                scenario_name="Bearish Continuation",
+                probability=f"{probability}%",
+                target_price=nearest_support,
+                timeline="5-15 days",
+                trigger_conditions=f"Break below {resistance_text}",
+                invalidation_level=nearest_resistance,
+                description=f"Downtrend continues toward {support_text} support"
+            ))
         
         # Add consolidation scenario
-        if len([p for p in active_patterns if "Consolidation" in p.get('pattern_name', '')]) > 0:
-            scenarios.append({
-                "scenario_name": "Range-bound Consolidation",
-                "probability": "35%", 
-                "target_price": f"{support_levels[0]['price'] if support_levels else self.current_price * 0.95:.2f} - {resistance_levels[0]['price'] if resistance_levels else self.current_price * 1.05:.2f}",
-                "timeline": "10-30 days",
-                "trigger_conditions": "Rejection at resistance and support holds",
-                "invalidation_level": "Break outside range",
-                "description": "Price continues to trade within established range"
-            })
-        
-        return scenarios
+        if any("Consolidation" in p.get('pattern_name', '') for p in active_patterns):
+            scenarios.append(ScenarioRecord(
+                scenario_name="Range-bound Consolidation",
+                probability="35%",
+                target_price=f"{support_text} - {resistance_text}",
+                timeline="10-30 days",
+                trigger_conditions="Rejection at resistance and support holds",
+                invalidation_level="Break outside range",
+                description="Price continues to trade within established range"
+            ))
+        
+        return [asdict(scenario) for scenario in scenarios]
     
     def generate_comprehensive_current_analysis(self):
         """Generate complete current market analysis focused on TODAY and forward-looking."""
         
-        print(f"🎯 Analyzing CURRENT market structure for {self.symbol} as of {self.current_date.strftime('%B %d, %Y')}...")
+        logger.info("Analyzing CURRENT market structure for %s as of %s", self.symbol, self._date_str)
         
         # Core analysis components
         trend_analysis = self.analyze_current_trend()
@@ -661,11 +774,21 @@ class CurrentMarketAnalyzer:
         active_patterns = self.detect_active_patterns()
         market_forecast = self.generate_current_market_forecast()
         
+        # Partition the active patterns once for the trading plan helpers
+        setups = []
+        bullish_patterns = bearish_patterns = 0
+        for pattern in active_patterns:
+            if 'entry_strategy' in pattern.get('trading_setup', {}):
+                setups.append(pattern)
+            direction = pattern.get('expected_direction', '')
+            bullish_patterns += 'Bullish' in direction
+            bearish_patterns += 'Bearish' in direction
+        
         # Compile comprehensive analysis
         current_analysis = {
             "analysis_summary": {
                 "stock_symbol": self.symbol,
-                "analysis_date": self.current_date.strftime("%B %d, %Y"),
+                "analysis_date": self._date_str,
                 "analysis_focus": f"Current market structure - last {self.analysis_window} days",
                 "current_price": round(self.current_price, 2),
                 "analysis_window": f"{self.analysis_window} days",
@@ -678,7 +801,8 @@ class CurrentMarketAnalyzer:
             "forward_looking_forecast": market_forecast,
             
             "immediate_trading_plan": self._generate_immediate_trading_plan(
-                trend_analysis, levels_analysis, active_patterns, market_forecast
+                trend_analysis, levels_analysis, active_patterns, market_forecast,
+                setups=setups, bullish_patterns=bullish_patterns, bearish_patterns=bearish_patterns
             ),
             
             "risk_management": self._generate_risk_management_plan(
@@ -688,76 +812,64 @@ class CurrentMarketAnalyzer:
         
         return current_analysis
     
-    def _generate_immediate_trading_plan(self, trend, levels, patterns, forecast):
-        """Generate specific actions to take in next 1-5 days."""
-        
-        immediate_actions = []
-        
-        # Based on active patterns
-        for pattern in patterns:
-            setup = pattern.get('trading_setup', {})
-            if 'entry_strategy' in setup:
-                entry = setup['entry_strategy']
-                immediate_actions.append({
-                    "action_type": "Pattern Setup",
-                    "priority": "High",
-                    "specific_action": pattern.get('next_action', 'Monitor pattern development'),
-                    "trigger_price": entry.get('trigger_price'),
-                    "timeline": pattern.get('timeline', 'Next 5 days'),
-                    "pattern_type": pattern.get('pattern_name')
-                })
-        
-        # Based on key levels
-        resistance_levels = levels['current_resistance_levels']
-        support_levels = levels['current_support_levels']
-        
-        if resistance_levels:
-            next_res = resistance_levels[0]
-            if next_res['distance_percent'] < 5:  # Within 5%
-                immediate_actions.append({
-                    "action_type": "Level Watch",
-                    "priority": "High", 
-                    "specific_action": f"Watch for reaction at resistance {next_res['price']:.2f}",
-                    "trigger_price": next_res['price'],
-                    "timeline": "Next 2-5 days",
-                    "level_type": "Resistance"
-                })
+    def _generate_immediate_trading_plan(self, trend, levels, patterns, forecast, *,
+                                         setups, bullish_patterns, bearish_patterns):
+        """
+        Generate specific actions to take in next 1-5 days.
+        setups are the patterns with an entry strategy; bullish/bearish_patterns are direction counts.
+        """
         
-        if support_levels:
-            next_sup = support_levels[0]
-            if next_sup['distance_percent'] < 5:  # Within 5%
-                immediate_actions.append({
-                    "action_type": "Level Watch",
-                    "priority": "High",
-                    "specific_action": f"Watch for reaction at support {next_sup['price']:.2f}",
-                    "trigger_price": next_sup['price'],
-                    "timeline": "Next 2-5 days", 
-                    "level_type": "Support"
-                })
+        # Pattern setups first, then level watches; materialized only for the JSON result
+        immediate_actions = itertools.chain(self._iter_pattern_actions(setups), self._iter_level_actions(levels))
         
         return {
             "trading_bias": trend['current_trend']['bias'],
-            "immediate_actions": immediate_actions,
+            "immediate_actions": [asdict(action) for action in immediate_actions],
             "position_recommendations": {
-                "current_stance": self._determine_current_stance(trend, patterns),
+                "current_stance": self._determine_current_stance(trend, bullish_patterns, bearish_patterns),
                 "position_sizing": "Conservative" if len(patterns) == 0 else "Moderate",
                 "hold_period": "5-20 days for pattern completion"
             }
         }
     
-    def _determine_current_stance(self, trend, patterns):
-        """Determine whether to be long, short, or neutral right now."""
-        
-        trend_bias = trend['current_trend']['bias']
-        bullish_patterns = len([p for p in patterns if 'Bullish' in p.get('expected_direction', '')])
-        bearish_patterns = len([p for p in patterns if 'Bearish' in p.get('expected_direction', '')])
+    def _iter_pattern_actions(self, setups):
+        """Yield an action for each pattern setup (active patterns with an entry strategy)."""
+        for pattern in setups:
+            entry = pattern['trading_setup']['entry_strategy']
+            yield PatternActionRecord(
+                action_type="Pattern Setup",
+                priority="High",
+                specific_action=pattern.get('next_action', 'Monitor pattern development'),
+                trigger_price=entry.get('trigger_price'),
+                timeline=pattern.get('timeline', 'Next 5 days'),
+                pattern_type=pattern.get('pattern_name')
+            )
+    
+    def _iter_level_actions(self, levels):
+        """Yield a watch action for the nearest resistance and support when within 5% of price."""
+        for side, level_type in (('resistance', 'Resistance'), ('support', 'Support')):
+            # Levels are sorted by distance, so the first hit is the nearest level
+            for level in self._levels_within(levels[f'current_{side}_levels'], 5)[:1]:
+                yield LevelActionRecord(
+                    action_type="Level Watch",
+                    priority="High",
+                    specific_action=f"Watch for reaction at {side} {level['price']:.2f}",
+                    trigger_price=level['price'],
+                    timeline="Next 2-5 days",
+                    level_type=level_type
+                )
+    
+    def _levels_within(self, levels, pct):
+        """Levels whose distance_percent from the current price is under pct, in their original order."""
+        distances = np.fromiter((level['distance_percent'] for level in levels), dtype=np.float64, count=len(levels))
+        return [levels[i] for i in np.flatnonzero(distances < pct)]
+    
+    def _determine_current_stance(self, trend, bullish_patterns, bearish_patterns):
+        """Determine whether to be long, short, or neutral right now (from the pattern direction counts)."""
         
-        if "Bullish" in trend_bias and bullish_patterns > bearish_patterns:
-            return "Long Bias - Look for buying opportunities"
-        elif "Bearish" in trend_bias and bearish_patterns > bullish_patterns:
-            return "Short Bias - Look for selling opportunities"
-        else:
-            return "Neutral - Wait for clear setup"
+        trend_sign = self.BIAS_SIGN.get(trend['current_trend']['bias'], 0)
+        pattern_sign = (bullish_patterns > bearish_patterns) - (bearish_patterns > bullish_patterns)
+        return self.STANCES.get((trend_sign, pattern_sign), "Neutral - Wait for clear setup")
     
     def _generate_risk_management_plan(self, levels, patterns):
         """Generate specific risk management based on current levels and patterns."""
@@ -765,6 +877,10 @@ class CurrentMarketAnalyzer:
         support_levels = levels['current_support_levels']
         resistance_levels = levels['current_resistance_levels']
         
+        # Nearest levels, falling back to 5%/10% from price
+        nearest_resistance = resistance_levels[0]['price'] if resistance_levels else self.current_price * 1.05
+        second_resistance = resistance_levels[1]['price'] if len(resistance_levels) > 1 else self.current_price * 1.10
+        
         # Determine stop levels
         if support_levels:
             primary_stop_long = support_levels[0]['price'] * 0.99  # Just below support
@@ -772,7 +888,7 @@ class CurrentMarketAnalyzer:
             primary_stop_long = self.current_price * 0.95  # 5% stop
             
         if resistance_levels:
-            primary_stop_short = resistance_levels[0]['price'] * 1.01  # Just above resistance
+            primary_stop_short = nearest_resistance * 1.01  # Just above resistance
         else:
             primary_stop_short = self.current_price * 1.05  # 5% stop
         
@@ -788,31 +904,79 @@ class CurrentMarketAnalyzer:
                 "concentration_limit": f"Maximum 5% of portfolio in {self.symbol}"
             },
             "exit_strategy": {
-                "profit_target_1": resistance_levels[0]['price'] if resistance_levels else self.current_price * 1.05,
-                "profit_target_2": resistance_levels[1]['price'] if len(resistance_levels) > 1 else self.current_price * 1.10,
+                "profit_target_1": nearest_resistance,
+                "profit_target_2": second_resistance,
                 "partial_exit_rule": "Take 50% profits at first target, let rest run"
             }
         }
 
 
-def generate_current_market_analysis(df, symbol, analysis_window=60):
+def _analysis_cache_path(df, symbol, analysis_window, cache_dir):
+    """Cache file for an analysis, keyed on the symbol, window and the bars the analysis reads."""
+    bars = df.tail(max(analysis_window, 21))  # Analysis window and the 20-day change lookback
+    digest = hashlib.sha1(f"{symbol}|{analysis_window}".encode())
+    digest.update(pd.util.hash_pandas_object(bars).to_numpy().tobytes())
+    return os.path.join(cache_dir, f"{digest.hexdigest()}.pkl")
+
+
+def generate_current_market_analysis(df, symbol, analysis_window=60,
+                                     cache_dir=None, cache_ttl=ANALYSIS_CACHE_TTL):
     """
     Main function to generate current market analysis.
     This replaces the old historical pattern detection approach.
+    
+    When cache_dir is given, finished analyses are memoized there as pickles for
+    cache_ttl seconds; by default every call recomputes.
     """
     
-    analyzer = CurrentMarketAnalyzer(df, symbol, analysis_window)
-    analysis = analyzer.generate_comprehensive_current_analysis()
+    analysis = None
+    cache_path = _analysis_cache_path(df, symbol, analysis_window, cache_dir) if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        if time.time() - os.path.getmtime(cache_path) < cache_ttl:
+            with open(cache_path, 'rb') as f:
+                analysis = pickle.load(f)
+        else:
+            # Drop the expired entry so the cache directory does not grow without bound
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(cache_path)
+    
+    if analysis is None:
+        analyzer = CurrentMarketAnalyzer(df, symbol, analysis_window)
+        analysis = analyzer.generate_comprehensive_current_analysis()
+        
+        if cache_path:
+            # Write then rename, so concurrent readers never see a partial pickle
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(analysis, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
     
     # Save to JSON with current date
     filename = f"{symbol}_current_analysis_{datetime.now().strftime('%Y%m%d_%H%M')}.json"
-    with open(filename, 'w') as f:
-        json.dump(analysis, f, indent=2, cls=NpEncoder)
+    dump_analysis(filename, analysis)
     
-    print(f"✅ Current market analysis saved to: {filename}")
+    logger.info("Current market analysis saved to: %s", filename)
     return analysis
 
 
+def _analyze_chunk(items, analysis_window):
+    """Worker for generate_current_market_analysis_batch: one chunk of (symbol, df) pairs."""
+    return {
+        symbol: CurrentMarketAnalyzer(df, symbol, analysis_window).generate_comprehensive_current_analysis()
+        for symbol, df in items
+    }
+
+
+def generate_current_market_analysis_batch(dfs, analysis_window=60, n_jobs=-1):
+    """
+    Current market analysis for many symbols ({symbol: ohlcv_df}) across worker processes.
+    Returns {symbol: analysis} without writing JSON files.
+    """
+    
+    return run_in_chunks(dfs.items(), _analyze_chunk, n_jobs, analysis_window)
+
+
 if __name__ == "__main__":
     # Example usage - this would be called by your main agent
     print("🎯 Current Market Analyzer - Focus on TODAY and Forward-Looking Analysis")
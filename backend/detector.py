@@ -1,16 +1,19 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from scipy import signal
 from scipy.ndimage import gaussian_filter1d
-from scipy.optimize import curve_fit
-from sklearn.preprocessing import MinMaxScaler
+from scipy.spatial.distance import cdist
+from numpy.lib.stride_tricks import sliding_window_view
 import warnings
+import heapq
 warnings.filterwarnings('ignore')
-from itertools import combinations
+from itertools import combinations, chain
 import logging
 import json
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
+from jit_kernels import scan_momentum_flags, slope_curvature, scan_double_extremes
 
 # ADD THIS HELPER CLASS
 class NpEncoder(json.JSONEncoder):
@@ -25,6 +28,22 @@ class NpEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super(NpEncoder, self).default(obj)
 
+
+@dataclass(slots=True)
+class PatternRecord:
+    """Base pattern from the window/pair detectors; converted with to_dict() in run_full_analysis."""
+    type: str
+    start: int
+    end: int
+    confidence: float
+    bullish: Optional[bool] = None
+    bearish: Optional[bool] = None
+    key_points: Optional[list] = None
+    
+    def to_dict(self):
+        """Plain dict for JSON export, leaving out the fields this pattern does not set"""
+        return {name: value for name in self.__slots__ if (value := getattr(self, name)) is not None}
+
 class DeterministicPatternDetector:
     def __init__(self, data):
         """
@@ -45,6 +64,17 @@ class DeterministicPatternDetector:
         self.valleys = []
         self.patterns = []
         
+        # Sorted peak/valley indices and smoothed prices, parallel to self.peaks/self.valleys
+        self._peak_idx = np.empty(0, dtype=np.int64)
+        self._peak_price = np.empty(0)
+        self._valley_idx = np.empty(0, dtype=np.int64)
+        self._valley_price = np.empty(0)
+        self._peak_prefix = np.zeros((4, 1))
+        self._valley_prefix = np.zeros((4, 1))
+        
+        # Reused across find_peaks_valleys calls to hold the negated series for valley search
+        self._neg_buffer = None
+        
         self.params = {
         'gaussian_sigma': 2,
         'peak_valley_min_distance': 5,
@@ -63,13 +93,12 @@ class DeterministicPatternDetector:
         """
         Calculate first and second derivatives (slope and curvature)
         First derivative: slope(i) = (P(i+1) - P(i-1)) / 2
-        Second derivative: curvature(i) = slope(i+1) - slope(i-1)
+        Second derivative: curvature(i) = (slope(i+1) - slope(i-1)) / 2
         """
-        # First derivative (slope)
-        self.slopes = np.gradient(self.smoothed_prices)
-        
-        # Second derivative (curvature)
-        self.curvature = np.gradient(self.slopes)
+        # Both derivatives of the smoothed series in a single pass
+        self.slopes, self.curvature = slope_curvature(
+            np.ascontiguousarray(self.smoothed_prices, dtype=np.float64)
+        )
         
         return self.slopes, self.curvature
     
@@ -86,30 +115,63 @@ class DeterministicPatternDetector:
             distance=min_distance,
             prominence=prominence_threshold
         )
+        if self._neg_buffer is None or self._neg_buffer.shape != self.smoothed_prices.shape:
+            self._neg_buffer = np.empty_like(self.smoothed_prices)
+        np.negative(self.smoothed_prices, out=self._neg_buffer)
         valley_indices, valley_props = signal.find_peaks(
-            -self.smoothed_prices,
+            self._neg_buffer,
             distance=min_distance,
             prominence=prominence_threshold
         )
 
-        self.peaks = [{
-            "index": int(idx),
-            "date": self.dates[idx],
-            "price": self.smoothed_prices[idx],
-            "confirmation_method": "local_maxima",
-            "strength": peak_props['prominences'][i]
-        } for i, idx in enumerate(peak_indices)]
+        self._peak_idx = peak_indices.astype(np.int64)
+        self._peak_price = self.smoothed_prices[peak_indices]
+        self._valley_idx = valley_indices.astype(np.int64)
+        self._valley_price = self.smoothed_prices[valley_indices]
+        self._peak_prefix = self._regression_prefix(self._peak_idx, self._peak_price)
+        self._valley_prefix = self._regression_prefix(self._valley_idx, self._valley_price)
 
-        self.valleys = [{
-            "index": int(idx),
-            "date": self.dates[idx],
-            "price": self.smoothed_prices[idx],
-            "confirmation_method": "local_minima",
-            "strength": valley_props['prominences'][i]
-        } for i, idx in enumerate(valley_indices)]
+        self.peaks = self._pivot_records(self._peak_idx, self._peak_price, peak_props['prominences'], "local_maxima")
+        self.valleys = self._pivot_records(self._valley_idx, self._valley_price, valley_props['prominences'], "local_minima")
 
         return self.peaks, self.valleys
     
+    def _pivot_records(self, indices, prices, strengths, method):
+        """
+        Pivot dicts for callers and JSON export, built from the pivot arrays with one
+        gather of their dates
+        """
+        return [{
+            "index": index,
+            "date": date,
+            "price": price,
+            "confirmation_method": method,
+            "strength": strength
+        } for index, date, price, strength in zip(indices.tolist(), self.dates[indices], prices, strengths)]
+    
+    def _window_bounds(self, indices, window_size, inclusive=False):
+        """
+        Slice bounds into a sorted index array for the window [i-w, i+w) around every
+        centre i in range(w, n-w), or [i-w, i+w] when inclusive. Returns (centres, lo, hi).
+        """
+        centres = np.arange(window_size, len(self.smoothed_prices) - window_size)
+        lo = np.searchsorted(indices, centres - window_size, side='left')
+        hi = np.searchsorted(indices, centres + window_size, side='right' if inclusive else 'left')
+        return centres, lo, hi
+    
+    @staticmethod
+    def _extreme_between(indices, prices, start, end, lowest=True):
+        """
+        Position of the lowest (or highest) pivot strictly between two bar indices in a
+        sorted pivot array, or None when there is none. Ties go to the earliest pivot.
+        """
+        lo = np.searchsorted(indices, start, side='right')
+        hi = np.searchsorted(indices, end, side='left')
+        if lo >= hi:
+            return None
+        window = prices[lo:hi]
+        return int(lo + (window.argmin() if lowest else window.argmax()))
+    
     def euclidean_distance(self, pattern1, pattern2):
         """
         Calculate Euclidean distance between two patterns
@@ -130,10 +192,33 @@ class DeterministicPatternDetector:
             return np.zeros_like(pattern)
         return (pattern - min_val) / (max_val - min_val)
     
+    @staticmethod
+    def normalize_patterns_batch(patterns):
+        """
+        normalize_pattern applied to every row of a 2-D array at once; flat rows become zeros
+        """
+        patterns = np.asarray(patterns, dtype=np.float64)
+        min_val = patterns.min(axis=1, keepdims=True)
+        max_val = patterns.max(axis=1, keepdims=True)
+        value_range = np.where(max_val == min_val, 1.0, max_val - min_val)
+        return (patterns - min_val) / value_range
+    
+    @staticmethod
+    def pattern_distances(query, templates):
+        """
+        Euclidean distance from one pattern to every row of a template array in a single
+        cdist call; all inf when the lengths differ, as in euclidean_distance
+        """
+        query = np.asarray(query, dtype=np.float64)
+        templates = np.atleast_2d(np.asarray(templates, dtype=np.float64))
+        if templates.shape[1] != len(query):
+            return np.full(len(templates), np.inf)
+        return cdist(query.reshape(1, -1), templates).ravel()
+    
     def calculate_trend_line(self, points):
         """
         Calculate trend line using least squares regression
-        y = mx + b where m = (nΣxy - ΣxΣy) / (nΣx² - (Σx)²)
+        y = mx + b where m = Σ(x-x̄)(y-ȳ) / Σ(x-x̄)², b = ȳ - m·x̄
         """
         if len(points) < 2:
             return 0, 0
@@ -146,64 +231,110 @@ class DeterministicPatternDetector:
             x = np.array([p[0] for p in points])
             y = np.array([p[1] for p in points])
         
-        n = len(points)
-        sum_x = np.sum(x)
-        sum_y = np.sum(y)
-        sum_xy = np.sum(x * y)
-        sum_x2 = np.sum(x ** 2)
+        return self._fit_trend_line(x, y)
+    
+    @staticmethod
+    def _fit_trend_line(x, y):
+        """
+        Least squares slope and intercept of y on x for index/price arrays of length >= 2
+        """
+        x_mean, y_mean = x.mean(), y.mean()
+        dx = x - x_mean
+        sxx = dx @ dx
         
-        if n * sum_x2 - sum_x ** 2 == 0:
+        if sxx == 0:
             return 0, y[0]
         
-        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x ** 2)
-        intercept = (sum_y - slope * sum_x) / n
-        
-        return slope, intercept
+        slope = (dx @ (y - y_mean)) / sxx
+        return slope, y_mean - slope * x_mean
+    
+    @staticmethod
+    def _regression_prefix(x, y):
+        """
+        Prefix sums of x, y, xy and x² over a pivot array (one row each, with a leading 0),
+        taken about the means: shifting leaves slopes unchanged and keeps the sums small
+        """
+        prefix = np.zeros((4, len(x) + 1))
+        if len(x):
+            x = x - x.mean()
+            y = y - y.mean()
+            np.cumsum([x, y, x * y, x * x], axis=1, out=prefix[:, 1:])
+        return prefix
+    
+    @staticmethod
+    def _trend_line_slopes(prefix, lo, hi):
+        """
+        Least squares slopes over every slice [lo[k], hi[k]) of a pivot array at once, from
+        its _regression_prefix sums. Each slice needs at least 2 points.
+        """
+        sum_x, sum_y, sum_xy, sum_x2 = prefix[:, hi] - prefix[:, lo]
+        n = hi - lo
+        return (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x ** 2)
     
     # REPLACE this method in DeterministicPatternDetector
-    def detect_head_and_shoulders(self, tolerance=0.05):
+    def detect_head_and_shoulders(self, tolerance=0.05, include_failures=False):
         """
         Detects Head and Shoulders patterns and returns detailed dictionaries for
         both valid and failed attempts, explaining the mathematical reasoning.
+        Failed attempts are only built when include_failures is set; otherwise the
+        second list is empty.
         """
         valid_patterns = []
         failed_patterns = []
         
-        for i in range(len(self.peaks) - 2):
+        # Lowest valley between each pair of consecutive peaks; a triple needs one in both gaps
+        gap_valleys = [self._extreme_between(self._valley_idx, self._valley_price, start, end)
+                       for start, end in zip(self._peak_idx[:-1].tolist(), self._peak_idx[1:].tolist())]
+        triples = [i for i in range(len(self.peaks) - 2)
+                   if gap_valleys[i] is not None and gap_valleys[i + 1] is not None]
+        
+        # --- Mathematical conditions for every triple at once ---
+        first = np.array(triples, dtype=np.int64)
+        left_valley = np.array([gap_valleys[i] for i in triples], dtype=np.int64)
+        right_valley = np.array([gap_valleys[i + 1] for i in triples], dtype=np.int64)
+        ls_prices, head_prices, rs_prices = (self._peak_price[first], self._peak_price[first + 1],
+                                             self._peak_price[first + 2])
+        nl_prices, nr_prices = self._valley_price[left_valley], self._valley_price[right_valley]
+        
+        sym_diff_pct = np.where(ls_prices != 0, np.abs(ls_prices - rs_prices) / ls_prices, np.inf)
+        neck_diff_pct = np.where(nl_prices != 0, np.abs(nl_prices - nr_prices) / nl_prices, np.inf)
+        head_sig_ratio = np.where(head_prices != 0,
+                                  (head_prices - np.maximum(ls_prices, rs_prices)) / head_prices, 0.0)
+        results = np.column_stack((
+            (head_prices > ls_prices) & (head_prices > rs_prices),
+            sym_diff_pct < tolerance,
+            neck_diff_pct < (tolerance * 0.6),
+            head_sig_ratio > (tolerance * 0.4),
+        ))
+        passing = results.sum(axis=1)
+        
+        # Neckline through the two valleys: the exact two-point line, no least squares needed
+        neck_x1, neck_x2 = self._valley_idx[left_valley], self._valley_idx[right_valley]
+        neck_slope = (nr_prices - nl_prices) / (neck_x2 - neck_x1)
+        neck_intercept = nl_prices - neck_slope * neck_x1
+        
+        # Without failure reporting only the triples meeting every condition need records
+        rows = range(len(triples)) if include_failures else np.flatnonzero(passing == results.shape[1]).tolist()
+        
+        for k in rows:
+            i = triples[k]
             p1, p2, p3 = self.peaks[i], self.peaks[i+1], self.peaks[i+2]
-            
-            v1_candidates = [v for v in self.valleys if p1['index'] < v['index'] < p2['index']]
-            v2_candidates = [v for v in self.valleys if p2['index'] < v['index'] < p3['index']]
-
-            if not v1_candidates or not v2_candidates: continue
-
-            v1 = min(v1_candidates, key=lambda x: x['price'])
-            v2 = min(v2_candidates, key=lambda x: x['price'])
-            
+            v1, v2 = self.valleys[left_valley[k]], self.valleys[right_valley[k]]
             ls_p, h_p, rs_p = p1['price'], p2['price'], p3['price']
             nl_p, nr_p = v1['price'], v2['price']
+            row = results[k].tolist()
+            cond1_res, cond2_res, cond3_res, cond4_res = row
 
-            # --- Detailed Mathematical Condition Checking ---
             conditions = {}
-            cond1_res = h_p > ls_p and h_p > rs_p
-            conditions['head_dominance'] = {"condition": "head > left_shoulder AND head > right_shoulder", "head_value": h_p, "left_shoulder_value": ls_p, "right_shoulder_value": rs_p, "result": bool(cond1_res)}
-
-            sym_diff_pct = abs(ls_p - rs_p) / ls_p if ls_p != 0 else float('inf')
-            cond2_res = sym_diff_pct < tolerance
-            conditions['shoulder_symmetry'] = {"condition": f"|left_shoulder - right_shoulder| / left_shoulder < {tolerance}", "difference_percentage": sym_diff_pct, "threshold": tolerance, "result": bool(cond2_res)}
-
-            neck_diff_pct = abs(nl_p - nr_p) / nl_p if nl_p != 0 else float('inf')
-            cond3_res = neck_diff_pct < (tolerance * 0.6)
-            conditions['neckline_level'] = {"condition": f"|neckline_left - neckline_right| / neckline_left < {tolerance * 0.6}", "difference_percentage": neck_diff_pct, "threshold": tolerance * 0.6, "result": bool(cond3_res)}
-            
-            head_sig_ratio = (h_p - max(ls_p, rs_p)) / h_p if h_p != 0 else 0
-            cond4_res = head_sig_ratio > (tolerance * 0.4)
-            conditions['head_significance'] = {"condition": f"(head - max(shoulders)) / head > {tolerance * 0.4}", "significance_ratio": head_sig_ratio, "threshold": tolerance * 0.4, "result": bool(cond4_res)}
+            conditions['head_dominance'] = {"condition": "head > left_shoulder AND head > right_shoulder", "head_value": h_p, "left_shoulder_value": ls_p, "right_shoulder_value": rs_p, "result": cond1_res}
+            conditions['shoulder_symmetry'] = {"condition": f"|left_shoulder - right_shoulder| / left_shoulder < {tolerance}", "difference_percentage": sym_diff_pct[k], "threshold": tolerance, "result": cond2_res}
+            conditions['neckline_level'] = {"condition": f"|neckline_left - neckline_right| / neckline_left < {tolerance * 0.6}", "difference_percentage": neck_diff_pct[k], "threshold": tolerance * 0.6, "result": cond3_res}
+            conditions['head_significance'] = {"condition": f"(head - max(shoulders)) / head > {tolerance * 0.4}", "significance_ratio": head_sig_ratio[k], "threshold": tolerance * 0.4, "result": cond4_res}
             
-            passing_conditions = sum(c['result'] for c in conditions.values())
+            passing_conditions = int(passing[k])
             all_met = passing_conditions == len(conditions)
             
-            m, c = np.polyfit([v1['index'], v2['index']], [v1['price'], v2['price']], 1)
+            m, c = neck_slope[k], neck_intercept[k]
             time_range = {"start_index": p1['index'], "end_index": p3['index'], "start_date": p1['date'], "end_date": p3['date'], "duration_days": (p3['date'] - p1['date']).days}
             key_points = {"left_shoulder": p1, "head": p2, "right_shoulder": p3, "left_valley": v1, "right_valley": v2, "neckline": {"slope": m, "equation": f"y = {m:.3f}x + {c:.2f}"}}
             final_condition = {"all_conditions_met": all_met, "passing_conditions": passing_conditions, "total_conditions": len(conditions)}
@@ -211,9 +342,9 @@ class DeterministicPatternDetector:
             if all_met:
                 valid_patterns.append({"pattern_id": f"HS_{p1['index']}", "type": "Head and Shoulders", "subtype": "bearish", "time_range": time_range, "key_points": key_points, "mathematical_conditions": conditions, "final_condition": final_condition, "target_calculation": {"neckline_break_target": nr_p - (h_p - max(nl_p, nr_p)), "calculation_method": "head_height_projection"}, "start": p1['index'], "end": p3['index'], "confidence": 0.85, "bearish": True})
             else:
-                failed_keys = [k for k, v in conditions.items() if not v['result']]
+                failed_keys = [key for key, ok in zip(conditions, row) if not ok]
                 final_condition['reason'] = f"Failed on: {', '.join(failed_keys)}"
-                failed_patterns.append({"pattern_id": f"FAIL_HS_{p1['index']}", "attempted_type": "Head and Shoulders", "time_range": time_range, "key_points": key_points, "condition_failures": {k:v for k,v in conditions.items() if not v['result']}, "failure_summary": final_condition})
+                failed_patterns.append({"pattern_id": f"FAIL_HS_{p1['index']}", "attempted_type": "Head and Shoulders", "time_range": time_range, "key_points": key_points, "condition_failures": {key: conditions[key] for key in failed_keys}, "failure_summary": final_condition})
 
         return valid_patterns, failed_patterns
     
@@ -223,57 +354,37 @@ class DeterministicPatternDetector:
         """
         patterns = []
         
-        # Double Top detection
-        for i in range(len(self.peaks) - 1):
+        # Double Top detection: consecutive peaks over a deep enough valley, scanned in one JIT pass
+        pairs, valleys, height_diff = scan_double_extremes(
+            self._peak_idx, self._peak_price, self._valley_idx, self._valley_price, tolerance, True
+        )
+        
+        for i, v, diff in zip(pairs.tolist(), valleys.tolist(), height_diff.tolist()):
             p1, p2 = self.peaks[i], self.peaks[i + 1]
-            
-            height_diff = abs(p1['price'] - p2['price']) / p1['price']
-            time_separation = p2['index'] - p1['index']
-            
-            if height_diff < tolerance and 10 < time_separation < 50:
-                # Find valley between peaks
-                valleys_between = [v for v in self.valleys if p1['index'] < v['index'] < p2['index']]
-                
-                if valleys_between:
-                    valley = min(valleys_between, key=lambda x: x['price'])
-                    valley_depth = (min(p1['price'], p2['price']) - valley['price']) / min(p1['price'], p2['price'])
-                    
-                    if valley_depth > 0.03:
-                        confidence = 0.90 - height_diff * 10
-                        patterns.append({
-                            'type': 'Double Top',
-                            'start': p1['index'],
-                            'end': p2['index'],
-                            'confidence': confidence,
-                            'bearish': True,
-                            'key_points': [p1, valley, p2]
-                        })
-        
-        # Double Bottom detection
-        for i in range(len(self.valleys) - 1):
+            patterns.append(PatternRecord(
+                type='Double Top',
+                start=p1['index'],
+                end=p2['index'],
+                confidence=0.90 - diff * 10,
+                bearish=True,
+                key_points=[p1, self.valleys[v], p2]
+            ))
+        
+        # Double Bottom detection: consecutive valleys under a high enough peak
+        pairs, peaks, height_diff = scan_double_extremes(
+            self._valley_idx, self._valley_price, self._peak_idx, self._peak_price, tolerance, False
+        )
+        
+        for i, p, diff in zip(pairs.tolist(), peaks.tolist(), height_diff.tolist()):
             v1, v2 = self.valleys[i], self.valleys[i + 1]
-            
-            height_diff = abs(v1['price'] - v2['price']) / v1['price']
-            time_separation = v2['index'] - v1['index']
-            
-            if height_diff < tolerance and 10 < time_separation < 50:
-                # Find peak between valleys
-                peaks_between = [p for p in self.peaks if v1['index'] < p['index'] < v2['index']]
-                
-                if peaks_between:
-                    peak = max(peaks_between, key=lambda x: x['price'])
-                    peak_height = (peak['price'] - max(v1['price'], v2['price'])) / max(v1['price'], v2['price'])
-                    
-                    if peak_height > 0.03:
-                        confidence = 0.90 - height_diff * 10
-                        patterns.append({
-                            'type': 'Double Bottom',
-                            'start': v1['index'],
-                            'end': v2['index'],
-                            'confidence': confidence,
-                            'bullish': True,
-                            'key_points': [v1, peak, v2]
-                        })
+            patterns.append(PatternRecord(
+                type='Double Bottom',
+                start=v1['index'],
+                end=v2['index'],
+                confidence=0.90 - diff * 10,
+                bullish=True,
+                key_points=[v1, self.peaks[p], v2]
+            ))
         
         return patterns
     
@@ -283,38 +394,39 @@ class DeterministicPatternDetector:
         """
         patterns = []
         
-        for i in range(window_size, len(self.smoothed_prices) - window_size):
-            window_data = self.smoothed_prices[i-window_size:i+window_size]
-            window_indices = np.arange(i-window_size, i+window_size)
-            
-            # Find peaks and valleys in window - FIXED to use dictionary structure
-            window_peaks = [p for p in self.peaks if i-window_size <= p['index'] < i+window_size]
-            window_valleys = [v for v in self.valleys if i-window_size <= v['index'] < i+window_size]
-            
-            if len(window_peaks) >= 2 and len(window_valleys) >= 2:
-                # Calculate trend lines
-                upper_slope, _ = self.calculate_trend_line(window_peaks)
-                lower_slope, _ = self.calculate_trend_line(window_valleys)
-                
-                # Ascending Triangle: flat top, rising bottom
-                if abs(upper_slope) < 0.1 and lower_slope > 0.2:
-                    patterns.append({
-                        'type': 'Ascending Triangle',
-                        'start': i - window_size,
-                        'end': i + window_size,
-                        'confidence': 0.88,
-                        'bullish': True
-                    })
-                
-                # Descending Triangle: falling top, flat bottom
-                elif upper_slope < -0.2 and abs(lower_slope) < 0.1:
-                    patterns.append({
-                        'type': 'Descending Triangle',
-                        'start': i - window_size,
-                        'end': i + window_size,
-                        'confidence': 0.88,
-                        'bearish': True
-                    })
+        # Peaks and valleys in every window, as slices of the sorted index arrays
+        centres, peak_lo, peak_hi = self._window_bounds(self._peak_idx, window_size)
+        _, valley_lo, valley_hi = self._window_bounds(self._valley_idx, window_size)
+        
+        candidates = np.flatnonzero((peak_hi - peak_lo >= 2) & (valley_hi - valley_lo >= 2))
+        
+        # Calculate trend lines for every candidate window in one pass
+        upper_slopes = self._trend_line_slopes(self._peak_prefix, peak_lo[candidates], peak_hi[candidates])
+        lower_slopes = self._trend_line_slopes(self._valley_prefix, valley_lo[candidates], valley_hi[candidates])
+        
+        # Ascending Triangle: flat top, rising bottom
+        ascending = (np.abs(upper_slopes) < 0.1) & (lower_slopes > 0.2)
+        # Descending Triangle: falling top, flat bottom
+        descending = ~ascending & (upper_slopes < -0.2) & (np.abs(lower_slopes) < 0.1)
+        hits = ascending | descending
+        
+        for i, is_ascending in zip(centres[candidates][hits].tolist(), ascending[hits].tolist()):
+            if is_ascending:
+                patterns.append(PatternRecord(
+                    type='Ascending Triangle',
+                    start=i - window_size,
+                    end=i + window_size,
+                    confidence=0.88,
+                    bullish=True
+                ))
+            else:
+                patterns.append(PatternRecord(
+                    type='Descending Triangle',
+                    start=i - window_size,
+                    end=i + window_size,
+                    confidence=0.88,
+                    bearish=True
+                ))
         
         return patterns
     
@@ -324,33 +436,36 @@ class DeterministicPatternDetector:
         """
         patterns = []
         
-        for i in range(window_size, len(self.smoothed_prices) - window_size):
-            window_peaks = [p for p in self.peaks if i-window_size <= p['index'] < i+window_size]
-            window_valleys = [v for v in self.valleys if i-window_size <= v['index'] < i+window_size]
-            
-            if len(window_peaks) >= 3 and len(window_valleys) >= 3:
-                upper_slope, _ = self.calculate_trend_line(window_peaks)
-                lower_slope, _ = self.calculate_trend_line(window_valleys)
-                
-                # Rising Wedge: both slopes positive, converging upward
-                if upper_slope > 0 and lower_slope > 0 and lower_slope > upper_slope:
-                    patterns.append({
-                        'type': 'Rising Wedge',
-                        'start': i - window_size,
-                        'end': i + window_size,
-                        'confidence': 0.85,
-                        'bearish': True
-                    })
-                
-                # Falling Wedge: both slopes negative, converging downward
-                elif upper_slope < 0 and lower_slope < 0 and upper_slope > lower_slope:
-                    patterns.append({
-                        'type': 'Falling Wedge',
-                        'start': i - window_size,
-                        'end': i + window_size,
-                        'confidence': 0.85,
-                        'bullish': True
-                    })
+        centres, peak_lo, peak_hi = self._window_bounds(self._peak_idx, window_size)
+        _, valley_lo, valley_hi = self._window_bounds(self._valley_idx, window_size)
+        
+        candidates = np.flatnonzero((peak_hi - peak_lo >= 3) & (valley_hi - valley_lo >= 3))
+        upper_slopes = self._trend_line_slopes(self._peak_prefix, peak_lo[candidates], peak_hi[candidates])
+        lower_slopes = self._trend_line_slopes(self._valley_prefix, valley_lo[candidates], valley_hi[candidates])
+        
+        # Rising Wedge: both slopes positive, converging upward
+        rising = (upper_slopes > 0) & (lower_slopes > 0) & (lower_slopes > upper_slopes)
+        # Falling Wedge: both slopes negative, converging downward
+        falling = ~rising & (upper_slopes < 0) & (lower_slopes < 0) & (upper_slopes > lower_slopes)
+        hits = rising | falling
+        
+        for i, is_rising in zip(centres[candidates][hits].tolist(), rising[hits].tolist()):
+            if is_rising:
+                patterns.append(PatternRecord(
+                    type='Rising Wedge',
+                    start=i - window_size,
+                    end=i + window_size,
+                    confidence=0.85,
+                    bearish=True
+                ))
+            else:
+                patterns.append(PatternRecord(
+                    type='Falling Wedge',
+                    start=i - window_size,
+                    end=i + window_size,
+                    confidence=0.85,
+                    bullish=True
+                ))
         
         return patterns
     
@@ -360,34 +475,21 @@ class DeterministicPatternDetector:
         """
         patterns = []
         
-        for i in range(pre_flag_window, len(self.smoothed_prices) - flag_window):
-            # Analyze pre-flag momentum
-            pre_flag_data = self.smoothed_prices[i-pre_flag_window:i]
-            flag_data = self.smoothed_prices[i:i+flag_window]
-            
-            # Calculate momentum
-            pre_flag_slope = (pre_flag_data[-1] - pre_flag_data[0]) / pre_flag_window
-            flag_slope = (flag_data[-1] - flag_data[0]) / flag_window
-            
-            # Volatility calculations
-            pre_flag_volatility = np.std(pre_flag_data)
-            flag_volatility = np.std(flag_data)
-            
-            # Deterministic criteria
-            strong_move = abs(pre_flag_slope) > 1.0
-            consolidation = abs(flag_slope) < abs(pre_flag_slope) * 0.3
-            lower_volatility = flag_volatility < pre_flag_volatility * 0.7
-            
-            if strong_move and consolidation and lower_volatility:
-                pattern_type = 'Bull Flag' if pre_flag_slope > 0 else 'Bear Flag'
-                patterns.append({
-                    'type': pattern_type,
-                    'start': i - pre_flag_window,
-                    'end': i + flag_window,
-                    'confidence': 0.87,
-                    'bullish': pre_flag_slope > 0,
-                    'bearish': pre_flag_slope < 0
-                })
+        # Deterministic criteria (strong move, consolidation, lower volatility) run in one JIT pass
+        indices, pre_flag_slopes = scan_momentum_flags(
+            np.ascontiguousarray(self.smoothed_prices, dtype=np.float64), pre_flag_window, flag_window
+        )
+        
+        for i, pre_flag_slope in zip(indices.tolist(), pre_flag_slopes.tolist()):
+            pattern_type = 'Bull Flag' if pre_flag_slope > 0 else 'Bear Flag'
+            patterns.append(PatternRecord(
+                type=pattern_type,
+                start=i - pre_flag_window,
+                end=i + flag_window,
+                confidence=0.87,
+                bullish=pre_flag_slope > 0,
+                bearish=pre_flag_slope < 0
+            ))
         
         return patterns
     
@@ -423,14 +525,14 @@ class DeterministicPatternDetector:
                         handle_depth = (right_peak['price'] - handle_data.min()) / right_peak['price']
                         
                         if 0.02 < handle_depth < 0.15:
-                            patterns.append({
-                                'type': 'Cup with Handle',
-                                'start': left_peak['index'],
-                                'end': handle_end,
-                                'confidence': 0.83,
-                                'bullish': True,
-                                'key_points': [left_peak, cup_bottom, right_peak]
-                            })
+                            patterns.append(PatternRecord(
+                                type='Cup with Handle',
+                                start=left_peak['index'],
+                                end=handle_end,
+                                confidence=0.83,
+                                bullish=True,
+                                key_points=[left_peak, cup_bottom, right_peak]
+                            ))
         
         return patterns
     
@@ -440,37 +542,41 @@ class DeterministicPatternDetector:
         """
         patterns = []
         
-        for i in range(window_size, len(self.smoothed_prices) - window_size):
-            window_data = self.smoothed_prices[i-window_size:i+window_size]
-            window_curvature = self.curvature[i-window_size:i+window_size]
-            
-            # Check for consistent curvature (rounding)
-            avg_curvature = np.mean(window_curvature)
-            curvature_consistency = np.std(window_curvature)
+        # Window mean/std of curvature for every centre at once from prefix sums of x and x^2
+        centres, peak_lo, peak_hi = self._window_bounds(self._peak_idx, window_size, inclusive=True)
+        _, valley_lo, valley_hi = self._window_bounds(self._valley_idx, window_size, inclusive=True)
+        csum = np.concatenate(([0.0], np.cumsum(self.curvature)))
+        csum2 = np.concatenate(([0.0], np.cumsum(self.curvature ** 2)))
+        span = 2 * window_size
+        avg_curvature = (csum[centres + window_size] - csum[centres - window_size]) / span
+        mean_square = (csum2[centres + window_size] - csum2[centres - window_size]) / span
+        curvature_consistency = np.sqrt(np.maximum(mean_square - avg_curvature ** 2, 0.0))
+        
+        # Rounding needs consistent curvature plus at least one peak (top) or valley (bottom)
+        # inside the inclusive window, i.e. a non-empty slice of the sorted pivot indices
+        rounding = ((avg_curvature < -0.1) & (peak_hi > peak_lo)) | ((avg_curvature > 0.1) & (valley_hi > valley_lo))
+        for k in np.flatnonzero(rounding & (curvature_consistency < 0.3)):
+            i = int(centres[k])
             
             # Rounding Top: negative curvature, consistent shape
-            if avg_curvature < -0.1 and curvature_consistency < 0.3:
-                peak_in_window = any(p['index'] for p in self.peaks if i-window_size <= p['index'] <= i+window_size)
-                if peak_in_window:
-                    patterns.append({
-                        'type': 'Rounding Top',
-                        'start': i - window_size,
-                        'end': i + window_size,
-                        'confidence': 0.80,
-                        'bearish': True
-                    })
+            if avg_curvature[k] < -0.1:
+                patterns.append(PatternRecord(
+                    type='Rounding Top',
+                    start=i - window_size,
+                    end=i + window_size,
+                    confidence=0.80,
+                    bearish=True
+                ))
             
             # Rounding Bottom: positive curvature, consistent shape
-            elif avg_curvature > 0.1 and curvature_consistency < 0.3:
-                valley_in_window = any(v['index'] for v in self.valleys if i-window_size <= v['index'] <= i+window_size)
-                if valley_in_window:
-                    patterns.append({
-                        'type': 'Rounding Bottom',
-                        'start': i - window_size,
-                        'end': i + window_size,
-                        'confidence': 0.80,
-                        'bullish': True
-                    })
+            else:
+                patterns.append(PatternRecord(
+                    type='Rounding Bottom',
+                    start=i - window_size,
+                    end=i + window_size,
+                    confidence=0.80,
+                    bullish=True
+                ))
         
         return patterns
     
@@ -478,25 +584,30 @@ class DeterministicPatternDetector:
         """
         Perform Fourier analysis to detect cyclical patterns
         """
-        # Apply FFT
-        fft_result = np.fft.fft(self.smoothed_prices)
-        frequencies = np.fft.fftfreq(len(self.smoothed_prices))
+        # Apply a real FFT: prices are real, so the one-sided spectrum holds every cycle once
+        fft_result = np.fft.rfft(self.smoothed_prices)
+        frequencies = np.fft.rfftfreq(len(self.smoothed_prices))
         
-        # Get dominant frequencies
+        # Get dominant frequencies, skipping the DC (mean level) bin; only the top
+        # n_components bins are partitioned out and sorted, not the whole spectrum
         magnitudes = np.abs(fft_result)
-        dominant_indices = np.argsort(magnitudes)[-n_components-1:-1]
+        spectrum = magnitudes[1:]
+        if len(spectrum) > n_components:
+            dominant_indices = np.argpartition(spectrum, -n_components)[-n_components:] + 1
+        else:
+            dominant_indices = np.arange(1, len(magnitudes))
+        dominant_indices = dominant_indices[np.argsort(-magnitudes[dominant_indices], kind='stable')]
         
         cycles = []
         for idx in dominant_indices:
-            if frequencies[idx] != 0:
-                period = 1 / abs(frequencies[idx])
-                cycles.append({
-                    'frequency': frequencies[idx],
-                    'period': period,
-                    'magnitude': magnitudes[idx]
-                })
+            period = 1 / frequencies[idx]
+            cycles.append({
+                'frequency': frequencies[idx],
+                'period': period,
+                'magnitude': magnitudes[idx]
+            })
         
-        return sorted(cycles, key=lambda x: x['magnitude'], reverse=True)
+        return cycles
     
     def run_full_analysis(self):
         """
@@ -519,17 +630,18 @@ class DeterministicPatternDetector:
         # Step 4: Pattern detection
         print("🔎 Detecting patterns...")
         
-        patterns = []
         # Note: detect_head_and_shoulders now returns (valid_patterns, failed_patterns)
         valid_hs, failed_hs = self.detect_head_and_shoulders()
-        patterns.extend(valid_hs)
         
-        patterns.extend(self.detect_double_top_bottom())
-        patterns.extend(self.detect_triangles())
-        patterns.extend(self.detect_wedges())
-        patterns.extend(self.detect_flags())
-        patterns.extend(self.detect_cup_and_handle())
-        patterns.extend(self.detect_rounding_patterns())
+        records = chain.from_iterable((
+            self.detect_double_top_bottom(),
+            self.detect_triangles(),
+            self.detect_wedges(),
+            self.detect_flags(),
+            self.detect_cup_and_handle(),
+            self.detect_rounding_patterns(),
+        ))
+        patterns = valid_hs + [record.to_dict() for record in records]
         
         self.patterns = patterns
         
@@ -561,6 +673,9 @@ class DeterministicPatternDetector:
         """
         Plot the analysis results - FIXED to use dictionary structure
         """
+        # Imported here so API callers that never plot skip matplotlib's import cost
+        import matplotlib.pyplot as plt
+        
         fig, axes = plt.subplots(3, 1, figsize=figsize)
         
         # Main price chart
@@ -757,6 +872,22 @@ class PatternTemplates:
         correlation = np.corrcoef(norm_data, norm_template)[0, 1]
         
         return correlation > threshold, correlation
+    
+    def match_windows_to_template(self, prices, template, threshold=0.3):
+        """
+        match_pattern_to_template for every len(template)-bar window of prices at once.
+        Returns (matches, correlations), one entry per window start.
+        """
+        windows = sliding_window_view(np.asarray(prices, dtype=np.float64), len(template))
+        norm_windows = DeterministicPatternDetector.normalize_patterns_batch(windows)
+        norm_template = DeterministicPatternDetector.normalize_patterns_batch(np.reshape(template, (1, -1)))[0]
+        
+        # Row-wise Pearson correlation against the single template
+        window_dev = norm_windows - norm_windows.mean(axis=1, keepdims=True)
+        template_dev = norm_template - norm_template.mean()
+        correlation = (window_dev @ template_dev) / np.sqrt((window_dev ** 2).sum(axis=1) * (template_dev @ template_dev))
+        
+        return correlation > threshold, correlation
 
 # Usage example for template matching
 def advanced_pattern_matching():
@@ -773,15 +904,13 @@ def advanced_pattern_matching():
     window_size = 21
     matches = []
     
+    # Score every window against each template in one batch
+    hs_match, hs_corrs = templates.match_windows_to_template(detector.smoothed_prices, templates.head_shoulders_template(window_size))
+    dt_match, dt_corrs = templates.match_windows_to_template(detector.smoothed_prices, templates.double_top_template(window_size))
+    
     for i in range(len(detector.smoothed_prices) - window_size):
-        segment = detector.smoothed_prices[i:i + window_size]
-        
-        # Test against different templates
-        hs_template = templates.head_shoulders_template(window_size)
-        dt_template = templates.double_top_template(window_size)
-        
         # Check Head & Shoulders match
-        is_hs_match, hs_corr = templates.match_pattern_to_template(segment, hs_template)
+        is_hs_match, hs_corr = hs_match[i], hs_corrs[i]
         if is_hs_match:
             matches.append({
                 'type': 'Head & Shoulders (Template)',
@@ -792,7 +921,7 @@ def advanced_pattern_matching():
             })
         
         # Check Double Top match
-        is_dt_match, dt_corr = templates.match_pattern_to_template(segment, dt_template)
+        is_dt_match, dt_corr = dt_match[i], dt_corrs[i]
         if is_dt_match:
             matches.append({
                 'type': 'Double Top (Template)',
@@ -996,6 +1125,7 @@ class TrendlineEngine:
             if not is_resistance and m < -0.1: continue # Support shouldn't slope down sharply
 
             # Validate against ALL historical pivots to find all touches
+            # (pivots are visited in index order, so touches come out date-sorted)
             touches = []
             for p in points_to_check:
                 expected_price = m * p['index'] + c
@@ -1014,7 +1144,15 @@ class TrendlineEngine:
                 })
         
         # Return the top-scoring candidate lines
-        return sorted(best_lines, key=lambda x: x['score'], reverse=True)[:2]
+        return heapq.nlargest(2, best_lines, key=lambda x: x['score'])
+
+    def find_all_trendlines(self, min_touches=2, tolerance=0.015):
+        """
+        Finds the best resistance and support trendlines in one call.
+        Returns (resistance_lines, support_lines).
+        """
+        return (self.find_best_trendlines(is_resistance=True, min_touches=min_touches, tolerance=tolerance),
+                self.find_best_trendlines(is_resistance=False, min_touches=min_touches, tolerance=tolerance))
     
 # Complete Analysis Suite
 class AdvancedPatternAnalyzer:
@@ -1108,7 +1246,7 @@ class AdvancedPatternAnalyzer:
         # Phase 2: Use the results of Phase 1 to run the new TrendlineEngine
         all_valid_patterns, all_failed_patterns = [], []
         
-        hs_valid, hs_failed = self.detector.detect_head_and_shoulders()
+        hs_valid, hs_failed = self.detector.detect_head_and_shoulders(include_failures=True)
         all_valid_patterns.extend(hs_valid)
         all_failed_patterns.extend(hs_failed)
         trendline_patterns = self._detect_trendline_patterns()
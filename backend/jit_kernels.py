@@ -0,0 +1,414 @@
+"""
+Numba-compiled numeric kernels shared by the market analyzers.
+
+Numba is optional: when it is not installed, njit degrades to a no-op
+decorator and the kernels run as plain Python over NumPy arrays.
+"""
+
+import numpy as np
+import logging
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+    logging.info("numba not available - analysis kernels will run without JIT")
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+    prange = range
+
+
+@njit(cache=True)
+def scan_flags(close, window_high, window_low, pole_len=15, flag_len=10):
+    """
+    Flag scan over every pole/flag window of a close array at once.
+
+    window_high/window_low are trailing rolling max/min of high/low over flag_len
+    bars, so the flag over [i, i + flag_len) is read at index i + flag_len - 1.
+    A candidate at bar i has a pole over [i - pole_len, i) that moves more than 3%
+    and a flag whose range is under half the pole move.
+    Returns (indices, pole_change, pole_change_pct, flag_range_pct, flag_high, flag_low).
+    """
+    n = len(close)
+    size = max(n - flag_len - pole_len, 0)
+
+    # Pole change for every window start at once: pole k spans [k, k + pole_len)
+    pole_base = close[:size]
+    pole_change = close[pole_len - 1:pole_len - 1 + size] - pole_base
+    pole_change_pct = pole_change / pole_base * 100
+
+    # Only windows with a significant pole (>3% move) reach the flag check
+    candidates = np.flatnonzero(np.abs(pole_change_pct) > 3)
+    window_end = candidates + pole_len + flag_len - 1
+    flag_high = window_high[window_end]
+    flag_low = window_low[window_end]
+    flag_range_pct = (flag_high - flag_low) / close[candidates + pole_len] * 100
+
+    # Flag should be smaller range than pole
+    keep = flag_range_pct < np.abs(pole_change_pct[candidates]) * 0.5
+    candidates = candidates[keep]
+
+    return (candidates + pole_len, pole_change[candidates], pole_change_pct[candidates],
+            flag_range_pct[keep], flag_high[keep], flag_low[keep])
+
+
+@njit(parallel=True, cache=True)
+def scan_flags_batch(close, window_high, window_low, lengths, pole_len=15, flag_len=10):
+    """
+    scan_flags over many symbols in parallel, one symbol per row.
+
+    Rows are left-aligned and padded past lengths[s]. Returns (counts, indices,
+    pole_change, pole_change_pct, flag_range_pct, flag_high, flag_low) where row s
+    of each 2-D result is valid up to counts[s].
+    """
+    n_symbols, width = close.shape
+    counts = np.zeros(n_symbols, dtype=np.int64)
+    indices = np.zeros((n_symbols, width), dtype=np.int64)
+    pole_change = np.zeros((n_symbols, width), dtype=np.float64)
+    pole_change_pct = np.zeros((n_symbols, width), dtype=np.float64)
+    flag_range_pct = np.zeros((n_symbols, width), dtype=np.float64)
+    flag_high = np.zeros((n_symbols, width), dtype=np.float64)
+    flag_low = np.zeros((n_symbols, width), dtype=np.float64)
+
+    for s in prange(n_symbols):
+        n = lengths[s]
+        result = scan_flags(close[s, :n], window_high[s, :n], window_low[s, :n], pole_len, flag_len)
+        count = len(result[0])
+        counts[s] = count
+        indices[s, :count] = result[0]
+        pole_change[s, :count] = result[1]
+        pole_change_pct[s, :count] = result[2]
+        flag_range_pct[s, :count] = result[3]
+        flag_high[s, :count] = result[4]
+        flag_low[s, :count] = result[5]
+
+    return counts, indices, pole_change, pole_change_pct, flag_range_pct, flag_high, flag_low
+
+
+@njit(cache=True)
+def detect_swings(highs, lows, k=5):
+    """
+    Swing highs/lows: bars at least as high (low) as the k bars on each side.
+    Bars within k of either edge never qualify. Returns (high_indices, low_indices).
+    """
+    n = len(highs)
+    high_indices = np.empty(max(n - 2 * k, 0), dtype=np.int64)
+    low_indices = np.empty(max(n - 2 * k, 0), dtype=np.int64)
+    n_highs = 0
+    n_lows = 0
+
+    for i in range(k, n - k):
+        is_swing_high = True
+        for j in range(1, k + 1):
+            # Written positively so a NaN on either side (or at i) disqualifies the bar
+            if not (highs[i] >= highs[i - j] and highs[i] >= highs[i + j]):
+                is_swing_high = False
+                break
+        if is_swing_high:
+            high_indices[n_highs] = i
+            n_highs += 1
+
+        is_swing_low = True
+        for j in range(1, k + 1):
+            if not (lows[i] <= lows[i - j] and lows[i] <= lows[i + j]):
+                is_swing_low = False
+                break
+        if is_swing_low:
+            low_indices[n_lows] = i
+            n_lows += 1
+
+    return high_indices[:n_highs], low_indices[:n_lows]
+
+
+def detect_swings_windowed(highs, lows, k=5):
+    """
+    detect_swings over strided (2k+1)-bar windows: a bar is a swing high (low)
+    when it equals the max (min) of the window centred on it.
+    """
+    if len(highs) < 2 * k + 1:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    
+    high_windows = sliding_window_view(highs, 2 * k + 1)
+    low_windows = sliding_window_view(lows, 2 * k + 1)
+    high_indices = np.flatnonzero(high_windows[:, k] == high_windows.max(axis=1)) + k
+    low_indices = np.flatnonzero(low_windows[:, k] == low_windows.min(axis=1)) + k
+    return high_indices.astype(np.int64), low_indices.astype(np.int64)
+
+
+# Without numba the nested-loop kernel runs as plain Python; the strided version is faster there
+if not HAVE_NUMBA:
+    detect_swings = detect_swings_windowed
+
+
+@njit(cache=True)
+def last_moving_averages(close, short=10, long=20):
+    """
+    Final short- and long-window simple moving averages of close in one backwards
+    pass over the last `long` bars. Each is NaN when close is shorter than its window.
+    """
+    n = len(close)
+    short_sum = 0.0
+    long_sum = 0.0
+    for k in range(min(long, n)):
+        value = close[n - 1 - k]
+        if k < short:
+            short_sum += value
+        long_sum += value
+    
+    sma_short = short_sum / short if n >= short else np.nan
+    sma_long = long_sum / long if n >= long else np.nan
+    return sma_short, sma_long
+
+
+@njit(cache=True)
+def half_means(close, half):
+    """
+    Means of the first and last `half` closes in one pass: (first_half_mean, second_half_mean).
+    """
+    n = len(close)
+    first_sum = 0.0
+    second_sum = 0.0
+    
+    for i in range(half):
+        first_sum += close[i]
+        second_sum += close[n - half + i]
+    
+    return first_sum / half, second_sum / half
+
+
+@njit(cache=True)
+def count_near(values, level, tolerance_range):
+    """Number of values within tolerance_range of level, without temporary arrays."""
+    count = 0
+    for value in values:
+        if abs(value - level) <= tolerance_range:
+            count += 1
+    return count
+
+
+@njit(cache=True, nogil=True)
+def scan_momentum_flags(prices, pre_flag_window=20, flag_window=15):
+    """
+    Flag scan for the pattern detector over every split point i of prices: the move over
+    [i - pre_flag_window, i) exceeds 1 per bar, the flag over [i, i + flag_window) slopes
+    under 30% of it and its std is under 70% of the move's. Window stds come from prefix
+    sums of x and x^2, taken about the series mean to limit cancellation.
+    Returns (indices, pre_flag_slopes).
+    """
+    n = len(prices)
+    shift = prices.mean() if n > 0 else 0.0
+    csum = np.zeros(n + 1)
+    csum2 = np.zeros(n + 1)
+    for j in range(n):
+        value = prices[j] - shift
+        csum[j + 1] = csum[j] + value
+        csum2[j + 1] = csum2[j] + value * value
+    
+    size = max(n - flag_window - pre_flag_window, 0)
+    indices = np.empty(size, dtype=np.int64)
+    pre_flag_slopes = np.empty(size, dtype=np.float64)
+    count = 0
+    
+    for i in range(pre_flag_window, n - flag_window):
+        # Strong move, then a flatter counter-trend flag
+        pre_flag_slope = (prices[i - 1] - prices[i - pre_flag_window]) / pre_flag_window
+        if abs(pre_flag_slope) <= 1.0:
+            continue
+        flag_slope = (prices[i + flag_window - 1] - prices[i]) / flag_window
+        if abs(flag_slope) >= abs(pre_flag_slope) * 0.3:
+            continue
+        
+        # Lower volatility inside the flag
+        pre_mean = (csum[i] - csum[i - pre_flag_window]) / pre_flag_window
+        pre_var = (csum2[i] - csum2[i - pre_flag_window]) / pre_flag_window - pre_mean * pre_mean
+        flag_mean = (csum[i + flag_window] - csum[i]) / flag_window
+        flag_var = (csum2[i + flag_window] - csum2[i]) / flag_window - flag_mean * flag_mean
+        if np.sqrt(max(flag_var, 0.0)) < np.sqrt(max(pre_var, 0.0)) * 0.7:
+            indices[count] = i
+            pre_flag_slopes[count] = pre_flag_slope
+            count += 1
+    
+    return indices[:count], pre_flag_slopes[:count]
+
+
+def scan_momentum_flags_numpy(prices, pre_flag_window=20, flag_window=15):
+    """
+    scan_momentum_flags with every split point evaluated at once: the slopes and the
+    prefix-sum window variances are whole-array expressions combined into one mask.
+    """
+    n = len(prices)
+    split = np.arange(pre_flag_window, max(n - flag_window, pre_flag_window))
+    centred = prices - (prices.mean() if n > 0 else 0.0)
+    csum = np.concatenate(([0.0], np.cumsum(centred)))
+    csum2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+    
+    pre_flag_slope = (prices[split - 1] - prices[split - pre_flag_window]) / pre_flag_window
+    flag_slope = (prices[split + flag_window - 1] - prices[split]) / flag_window
+    pre_mean = (csum[split] - csum[split - pre_flag_window]) / pre_flag_window
+    pre_var = (csum2[split] - csum2[split - pre_flag_window]) / pre_flag_window - pre_mean * pre_mean
+    flag_mean = (csum[split + flag_window] - csum[split]) / flag_window
+    flag_var = (csum2[split + flag_window] - csum2[split]) / flag_window - flag_mean * flag_mean
+    
+    keep = ((np.abs(pre_flag_slope) > 1.0)
+            & (np.abs(flag_slope) < np.abs(pre_flag_slope) * 0.3)
+            & (np.sqrt(np.maximum(flag_var, 0.0)) < np.sqrt(np.maximum(pre_var, 0.0)) * 0.7))
+    return split[keep].astype(np.int64), pre_flag_slope[keep]
+
+
+# Without numba the kernel loop runs as plain Python; the whole-array version is faster there
+if not HAVE_NUMBA:
+    scan_momentum_flags = scan_momentum_flags_numpy
+
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def scan_double_extremes(idx, price, between_idx, between_price, tolerance=0.02, tops=True):
+    """
+    Double top (tops=True) or double bottom scan over consecutive pivots idx/price. A pair
+    qualifies when its heights differ by under `tolerance`, it spans 10-50 bars and the
+    lowest (highest) opposite pivot strictly between them sits more than 3% beyond the
+    nearer of the pair. One cursor walks the opposite pivots, so the scan is O(P + V).
+    Returns (pair_positions, between_positions, height_diffs).
+    """
+    n = len(idx)
+    m = len(between_idx)
+    size = max(n - 1, 0)
+    pairs = np.empty(size, dtype=np.int64)
+    betweens = np.empty(size, dtype=np.int64)
+    height_diffs = np.empty(size, dtype=np.float64)
+    count = 0
+    j = 0
+    
+    for i in range(n - 1):
+        # Move the cursor past the first pivot of the pair
+        while j < m and between_idx[j] <= idx[i]:
+            j += 1
+        
+        height_diff = abs(price[i] - price[i + 1]) / price[i]
+        separation = idx[i + 1] - idx[i]
+        if not (height_diff < tolerance and 10 < separation < 50):
+            continue
+        
+        # Lowest (highest) opposite pivot between the pair; ties keep the earliest
+        best = -1
+        k = j
+        while k < m and between_idx[k] < idx[i + 1]:
+            if best < 0 or (between_price[k] < between_price[best] if tops else between_price[k] > between_price[best]):
+                best = k
+            k += 1
+        if best < 0:
+            continue
+        
+        if tops:
+            edge = min(price[i], price[i + 1])
+            depth = (edge - between_price[best]) / edge
+        else:
+            edge = max(price[i], price[i + 1])
+            depth = (between_price[best] - edge) / edge
+        
+        if depth > 0.03:
+            pairs[count] = i
+            betweens[count] = best
+            height_diffs[count] = height_diff
+            count += 1
+    
+    return pairs[:count], betweens[:count], height_diffs[:count]
+
+
+def scan_double_extremes_numpy(idx, price, between_idx, between_price, tolerance=0.02, tops=True):
+    """
+    scan_double_extremes with the height/spacing screen vectorized over all pairs and a
+    searchsorted slice of the opposite pivots for each surviving pair.
+    """
+    height_diff = np.abs(price[:-1] - price[1:]) / price[:-1]
+    separation = np.diff(idx)
+    pairs = []
+    betweens = []
+    
+    for i in np.flatnonzero((height_diff < tolerance) & (separation > 10) & (separation < 50)).tolist():
+        lo = np.searchsorted(between_idx, idx[i], side='right')
+        hi = np.searchsorted(between_idx, idx[i + 1], side='left')
+        if lo >= hi:
+            continue
+        
+        window = between_price[lo:hi]
+        best = int(lo + (window.argmin() if tops else window.argmax()))
+        if tops:
+            edge = min(price[i], price[i + 1])
+            depth = (edge - between_price[best]) / edge
+        else:
+            edge = max(price[i], price[i + 1])
+            depth = (between_price[best] - edge) / edge
+        
+        if depth > 0.03:
+            pairs.append(i)
+            betweens.append(best)
+    
+    pairs = np.array(pairs, dtype=np.int64)
+    return pairs, np.array(betweens, dtype=np.int64), height_diff[pairs]
+
+
+# Without numba the per-pair loop runs as plain Python; screening with arrays first is faster there
+if not HAVE_NUMBA:
+    scan_double_extremes = scan_double_extremes_numpy
+
+
+@njit(cache=True)
+def slope_curvature(values):
+    """
+    First and second np.gradient of values (unit spacing, first-order edges) in one pass:
+    each curvature term is written as soon as the slope after it is known.
+    """
+    n = len(values)
+    if n < 2:
+        raise ValueError("slope_curvature needs at least 2 values")
+    
+    slopes = np.empty(n, dtype=np.float64)
+    curvature = np.empty(n, dtype=np.float64)
+    slopes[0] = values[1] - values[0]
+    for i in range(1, n):
+        if i < n - 1:
+            slopes[i] = (values[i + 1] - values[i - 1]) / 2.0
+        else:
+            slopes[i] = values[i] - values[i - 1]
+        if i >= 2:
+            curvature[i - 1] = (slopes[i] - slopes[i - 2]) / 2.0
+    
+    curvature[0] = slopes[1] - slopes[0]
+    curvature[n - 1] = slopes[n - 1] - slopes[n - 2]
+    return slopes, curvature
+
+
+def slope_curvature_numpy(values):
+    """slope_curvature as two vectorized np.gradient calls."""
+    slopes = np.gradient(values)
+    return slopes, np.gradient(slopes)
+
+
+# Without numba the per-element loop runs as plain Python; np.gradient is faster there
+if not HAVE_NUMBA:
+    slope_curvature = slope_curvature_numpy
+
+
+def warm_up():
+    """
+    Compile (or load from the on-disk cache) every kernel with the argument types the
+    analyzers use, so the first analysis request does not pay the JIT cost.
+    """
+    values = np.linspace(100.0, 110.0, 60)
+    scan_flags(values, values, values)
+    scan_flags_batch(values.reshape(1, -1), values.reshape(1, -1), values.reshape(1, -1),
+                     np.array([len(values)], dtype=np.int64))
+    detect_swings(values, values, 5)
+    last_moving_averages(values, 10, 20)
+    half_means(values, 10)
+    count_near(values, 105.0, 2.1)
+    scan_momentum_flags(values, 20, 15)
+    slope_curvature(values)
+    pivots = np.arange(0, 60, 12, dtype=np.int64)
+    scan_double_extremes(pivots, values[pivots], pivots + 6, values[pivots + 6], 0.02, True)
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jit_kernels import detect_swings, detect_swings_windowed
+
+
+def _zigzag():
+    return np.array([1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1], dtype=np.float64)
+
+
+def test_detect_swings_matches_windowed():
+    highs = _zigzag()
+    lows = highs - 0.5
+    for got, expected in zip(detect_swings(highs, lows, 5), detect_swings_windowed(highs, lows, 5)):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_detect_swings_nan_bar_is_never_a_swing():
+    highs = _zigzag()
+    highs[8] = np.nan
+    lows = highs.copy()
+
+    high_indices, low_indices = detect_swings(highs, lows, 5)
+    expected_highs, expected_lows = detect_swings_windowed(highs, lows, 5)
+
+    np.testing.assert_array_equal(high_indices, expected_highs)
+    np.testing.assert_array_equal(low_indices, expected_lows)
+    np.testing.assert_array_equal(high_indices, [15])
+    np.testing.assert_array_equal(low_indices, [])